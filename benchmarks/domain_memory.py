@@ -0,0 +1,94 @@
+"""Memory used per game by the domain model, for a synthetic catalog held in memory.
+
+Run from the project directory:
+
+    python benchmarks/domain_memory.py [--games 1000000]
+
+Every game gets a unique title and image URL, a price, a release date, one of 1000 shared publishers and two of
+24 shared genres, like the memory repository holds them after reading the CSV. The figure reported is the memory
+allocated while building the catalog, divided by the number of games. The same catalog is built twice: once
+from the dict-backed model the repository started with, kept below as the baseline, and once from the current
+slotted model in games.domainmodel.
+"""
+
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from games.domainmodel import model
+
+
+class baseline:
+    """The domain model before slots: every object keeps its attributes in an instance dict, and a game creates
+    its genres, reviews and favourite_users lists up front."""
+
+    # Plain attributes stand in for the name-mangled ones behind the model's properties; the dicts hold the same
+    # number of keys either way
+
+    class Publisher:
+        def __init__(self, publisher_name: str):
+            self.publisher_name = publisher_name.strip()
+
+    class Genre:
+        def __init__(self, genre_name: str):
+            self.genre_name = genre_name.strip()
+
+    class Game:
+        def __init__(self, game_id: int, game_title: str):
+            self.game_id = game_id
+            self.title = game_title.strip()
+            self.price = None
+            self.release_date = None
+            self.description = None
+            self.image_url = None
+            self.website_url = None
+            self.genres: list = []
+            self.reviews: list = []
+            self.publisher = None
+            self.favourite_users = []
+
+        def add_genre(self, genre):
+            if genre not in self.genres:
+                self.genres.append(genre)
+
+def build_catalog(number_of_games, domain):
+    Game, Genre, Publisher = domain.Game, domain.Genre, domain.Publisher
+    publishers = [Publisher(f"Publisher {i}") for i in range(1000)]
+    genres = [Genre(f"Genre {i}") for i in range(24)]
+    games = []
+    for game_id in range(number_of_games):
+        game = Game(game_id, f"Game {game_id}")
+        game.price = 9.99
+        game.release_date = "Oct 21, 2008"
+        game.image_url = f"https://cdn.akamai.steamstatic.com/steam/apps/{game_id}/header.jpg"
+        game.publisher = publishers[game_id % len(publishers)]
+        game.add_genre(genres[game_id % len(genres)])
+        game.add_genre(genres[(game_id + 1) % len(genres)])
+        games.append(game)
+    return games
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--games', type=int, default=1000000)
+    arguments = parser.parse_args()
+
+    for name, domain in (('baseline', baseline), ('current', model)):
+        gc.collect()
+        tracemalloc.start()
+        games = build_catalog(arguments.games, domain)
+        gc.collect()
+        allocated, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del games
+
+        print(f"{name:>8}: {arguments.games} games, {allocated / arguments.games:.0f} bytes per game "
+              f"({allocated / 2 ** 20:.1f} MiB in total)")
+
+
+if __name__ == '__main__':
+    main()
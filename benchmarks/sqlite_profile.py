@@ -0,0 +1,117 @@
+"""Read/write throughput of the SqlAlchemyRepository with and without the SQLite tuning profile.
+
+Run from the project directory:
+
+    python benchmarks/sqlite_profile.py [--seconds 10] [--readers 4] [--writers 2]
+
+Each profile gets its own freshly populated database file. Reader threads browse pages and open game
+descriptions while writer threads add reviews and toggle wishlist entries, each operation in its own
+session like a request in the web app.
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker, clear_mappers
+
+from games import create_database_engine, SQLITE_PROFILES
+from games.adapters import repository_populate
+from games.adapters.database_repository import SqlAlchemyRepository
+from games.adapters.orm import metadata, map_model_to_tables, create_search_index
+from games.adapters.repository import title_key
+from games.domainmodel.model import User, Review
+
+
+def build_repository(database_path, profile):
+    config = {'SQLALCHEMY_DATABASE_URI': f'sqlite:///{database_path}', 'SQLITE_PROFILE': profile}
+    engine = create_database_engine(config)
+    metadata.create_all(engine)
+    create_search_index(engine)
+    repo = SqlAlchemyRepository(sessionmaker(autocommit=False, autoflush=True, bind=engine))
+    repository_populate.populate(repo)
+    repo.close_session()
+    return repo, engine
+
+
+def reader(repo, game_ids, deadline, counts):
+    while time.time() < deadline:
+        try:
+            game = repo.get_game_id(random.choice(game_ids))
+            repo.get_games_after(title_key(game), 5)
+            counts['reads'] += 1
+        except OperationalError:
+            counts['errors'] += 1
+        finally:
+            repo.close_session()
+
+
+def writer(repo, username, game_ids, deadline, counts):
+    while time.time() < deadline:
+        game_id = random.choice(game_ids)
+        try:
+            if random.random() < 0.5:
+                user = repo.get_user(username)
+                repo.add_review(Review(user, repo.get_game_id(game_id), random.randint(0, 5), "Benchmark review"))
+            else:
+                repo.add_game_to_wishlist(username, game_id)
+                repo.remove_game_from_wishlist(username, game_id)
+            counts['writes'] += 1
+        except OperationalError:
+            counts['errors'] += 1
+        finally:
+            repo.close_session()
+
+
+def run(profile, seconds, readers, writers, directory):
+    repo, engine = build_repository(os.path.join(directory, f'{profile}.db'), profile)
+    game_ids = [game.game_id for game in repo.get_games()]
+    for i in range(writers):
+        repo.add_user(User(f'writer{i}', 'Benchmark1'))
+    repo.close_session()
+
+    thread_counts = []
+    threads = []
+    deadline = time.time() + seconds
+    for i in range(readers + writers):
+        counts = {'reads': 0, 'writes': 0, 'errors': 0}
+        thread_counts.append(counts)
+        if i < readers:
+            threads.append(threading.Thread(target=reader, args=(repo, game_ids, deadline, counts)))
+        else:
+            threads.append(threading.Thread(target=writer,
+                                            args=(repo, f'writer{i - readers}', game_ids, deadline, counts)))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+
+    totals = {name: sum(counts[name] for counts in thread_counts) for name in ('reads', 'writes', 'errors')}
+    print(f"{profile:>8}: {totals['reads'] / seconds:8.1f} reads/s {totals['writes'] / seconds:8.1f} writes/s "
+          f"{totals['errors']:5d} errors")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--writers', type=int, default=2)
+    arguments = parser.parse_args()
+
+    clear_mappers()
+    map_model_to_tables()
+    with tempfile.TemporaryDirectory() as directory:
+        for profile in SQLITE_PROFILES:
+            run(profile, arguments.seconds, arguments.readers, arguments.writers, directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -16,4 +16,16 @@ class Config:
     echo_string = environ.get('SQLALCHEMY_ECHO')
     SQLALCHEMY_ECHO = False
     if echo_string.lower().strip() == "true":
-        SQLALCHEMY_ECHO = True
\ No newline at end of file
+        SQLALCHEMY_ECHO = True
+
+    # Connection pool configuration
+    SQLALCHEMY_POOL = environ.get('SQLALCHEMY_POOL', 'queue')
+    SQLALCHEMY_POOL_SIZE = int(environ.get('SQLALCHEMY_POOL_SIZE', 5))
+    SQLALCHEMY_MAX_OVERFLOW = int(environ.get('SQLALCHEMY_MAX_OVERFLOW', 10))
+    SQLALCHEMY_POOL_TIMEOUT = int(environ.get('SQLALCHEMY_POOL_TIMEOUT', 30))
+
+    # SQLite tuning applied to every connection
+    SQLITE_PROFILE = environ.get('SQLITE_PROFILE', 'tuned')
+    SQLITE_MMAP_SIZE = int(environ.get('SQLITE_MMAP_SIZE', 268435456))
+    SQLITE_CACHE_SIZE = int(environ.get('SQLITE_CACHE_SIZE', -65536))
+    SQLITE_BUSY_TIMEOUT = int(environ.get('SQLITE_BUSY_TIMEOUT', 5000))
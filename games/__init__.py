@@ -5,11 +5,11 @@ from flask import Flask, render_template
 #  stay here!
 from games.domainmodel.model import Game
 from games.adapters import database_repository, repository_populate, memory_repository
-from games.adapters.orm import metadata, map_model_to_tables
+from games.adapters.orm import metadata, map_model_to_tables, create_search_index, upgrade_schema
 import games.adapters.repository as repo  # Import repo
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, clear_mappers
-from sqlalchemy.pool import NullPool
+from sqlalchemy.pool import NullPool, QueuePool, SingletonThreadPool
 from pathlib import Path
 import os
 
@@ -27,6 +27,60 @@ import os
 #     return some_game
 #
 
+POOL_CLASSES = {'queue': QueuePool, 'singleton': SingletonThreadPool, 'null': NullPool}
+
+
+# PRAGMAs run on every new SQLite connection. 'tuned' uses write-ahead logging so readers don't block on
+# review and wishlist writes, and only syncs to disk at checkpoints instead of on every commit.
+SQLITE_PROFILES = {
+    'default': {},
+    'tuned': {'journal_mode': 'WAL', 'synchronous': 'NORMAL', 'temp_store': 'MEMORY'},
+}
+
+
+def sqlite_pragmas(config):
+    profile = config.get('SQLITE_PROFILE', 'tuned')
+    pragmas = dict(SQLITE_PROFILES[profile])
+    if profile != 'default':
+        pragmas['mmap_size'] = config.get('SQLITE_MMAP_SIZE', 268435456)  # Bytes of the file read through mmap
+        pragmas['cache_size'] = config.get('SQLITE_CACHE_SIZE', -65536)  # Pages, or KiB when negative
+        pragmas['busy_timeout'] = config.get('SQLITE_BUSY_TIMEOUT', 5000)  # Milliseconds to wait on a lock
+    return pragmas
+
+
+def apply_sqlite_pragmas(engine, pragmas):
+    if len(pragmas) == 0:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+
+
+def create_database_engine(config):
+    # Builds the engine with the pool chosen in the config, so requests reuse connections instead of opening new ones
+    database_uri = config['SQLALCHEMY_DATABASE_URI']
+    pool_class = POOL_CLASSES[config.get('SQLALCHEMY_POOL', 'queue')]
+    pool_options = {}
+    if database_uri in ('sqlite://', 'sqlite:///:memory:'):
+        # Every connection to an in-memory database is a different database, so keep one per thread
+        pool_class = SingletonThreadPool
+    if pool_class is QueuePool:
+        pool_options = {'pool_size': config.get('SQLALCHEMY_POOL_SIZE', 5),
+                        'max_overflow': config.get('SQLALCHEMY_MAX_OVERFLOW', 10),
+                        'pool_timeout': config.get('SQLALCHEMY_POOL_TIMEOUT', 30)}
+    elif pool_class is SingletonThreadPool:
+        pool_options = {'pool_size': config.get('SQLALCHEMY_POOL_SIZE', 5)}
+    engine = create_engine(database_uri, connect_args={"check_same_thread": False}, poolclass=pool_class,
+                           echo=config.get('SQLALCHEMY_ECHO', False), **pool_options)
+    if engine.dialect.name == 'sqlite':
+        apply_sqlite_pragmas(engine, sqlite_pragmas(config))
+    return engine
+
+
 def create_app(test_config=None):
     """Construct the core application."""
 
@@ -44,9 +98,7 @@ def create_app(test_config=None):
         repository_populate.populate(repo.repo_instance)
 
     elif app.config['REPOSITORY'] == 'database':
-        database_uri = app.config['SQLALCHEMY_DATABASE_URI']
-        database_echo = app.config['SQLALCHEMY_ECHO']
-        database_engine = create_engine(database_uri, connect_args={"check_same_thread": False}, poolclass = NullPool, echo=database_echo)
+        database_engine = create_database_engine(app.config)
 
         session_factory = sessionmaker(autocommit=False, autoflush=True, bind=database_engine)
         repo.repo_instance = database_repository.SqlAlchemyRepository(session_factory)
@@ -56,12 +108,21 @@ def create_app(test_config=None):
             metadata.create_all(database_engine)  # Conditionally create database tables.
             for table in reversed(metadata.sorted_tables):  # Remove any data from the tables.
                 database_engine.execute(table.delete())
+            create_search_index(database_engine)
             map_model_to_tables()
-            repository_populate.populate(repo.repo_instance)
+            repository_populate.populate(repo.repo_instance, lambda count: print(f"  {count} games loaded"))
             print("REPOPULATING DATABASE... FINISHED")
         else:
+            upgrade_schema(database_engine, repository_populate.read_games())  # Only read if a column needs filling in
+            create_search_index(database_engine)  # Builds the search table for databases made before it existed
             map_model_to_tables()
 
+        # Each request gets its own session, which is closed when the request ends, even if it failed
+        @app.teardown_request
+        def close_database_session(exception=None):
+            if isinstance(repo.repo_instance, database_repository.SqlAlchemyRepository):
+                repo.repo_instance.close_session()
+
 
 
     with app.app_context():
@@ -77,6 +138,8 @@ def create_app(test_config=None):
         app.register_blueprint(profile.profile_blueprint)
         from .wishlist import wishlist
         app.register_blueprint(wishlist.wishlist_blueprint)
+        from .leaderboards import leaderboards
+        app.register_blueprint(leaderboards.leaderboards_blueprint)
         #from .games import games
         #app.register_blueprint(games.games_blueprint)
     return app
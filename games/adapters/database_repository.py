@@ -1,12 +1,16 @@
 from datetime import date
-from typing import List
+from typing import Iterable, List
 import os
-from sqlalchemy import desc,asc
-from sqlalchemy.orm import scoped_session
+from sqlalchemy import desc, asc, and_, or_, tuple_, text, select, func, case, event
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import scoped_session, joinedload, load_only, selectinload
 from sqlalchemy.orm.exc import NoResultFound
 
-from games.domainmodel.model import User, Game, Review, Wishlist, Publisher
-from games.adapters.repository import AbstractRepository
+from games.domainmodel.model import User, Game, Review, Wishlist, Publisher, Genre
+from games.adapters.repository import AbstractRepository, title_key, range_after, range_before
+from games.adapters.orm import (games_table, games_search_table, publishers_table, genres_table,
+                                game_genres_table, reviews_table, rankings_table, rating_counts_sql)
+from games.adapters.prefix_index import PrefixIndex
 from games.adapters.datareader.csvdatareader import GameFileCSVReader, UserFileCSVReader
 
 class SessionContextmanager:
@@ -31,18 +35,40 @@ class SessionContextmanager:
     def rollback(self):
         return self.__session.rollback()
 
-    def reset_session(self): # This method can be used to start a new session each http request. (before_request callback)
+    def reset_session(self): # Starts the next http request with a fresh session (before_request callback)
         self.close_current_session()
-        self.__session = scoped_session(self.__session_factory)
 
-    def close_current_session(self):
+    def close_current_session(self): # Closes this thread's session and returns its connection to the pool
         if not self.__session is None:
-            self.__session.close()
+            self.__session.remove()
+
+def share_stored_publishers(session, flush_context, instances):
+    # Publisher names are unique, so a game with a new Publisher is given the stored one with that name instead.
+    # Games reach the session through cascades too (a user's reviews, a review's game), hence a flush hook.
+    publishers = dict()  # publisher name -> the Publisher the games of this flush share
+    for game in [instance for instance in list(session.new) + list(session.dirty) if isinstance(instance, Game)]:
+        publisher = game.publisher
+        if publisher is None or publisher not in session.new:
+            continue
+        name = publisher.publisher_name
+        if name not in publishers:
+            with session.no_autoflush:
+                publishers[name] = session.query(Publisher).filter(
+                    Publisher._Publisher__publisher_name == name).one_or_none() or publisher
+        if publishers[name] is not publisher:
+            game.publisher = publishers[name]
+            session.expunge(publisher)
+
 
 class SqlAlchemyRepository(AbstractRepository):
 
     def __init__(self, session_factory):
+        if not event.contains(session_factory, 'before_flush', share_stored_publishers):
+            event.listen(session_factory, 'before_flush', share_stored_publishers)
         self._session_cm = SessionContextmanager(session_factory)
+        self._sorted_genres = None  # cached sidebar genres, cleared by add_game
+        self._has_search_index = None  # whether the games_fts table exists, checked on first use
+        self._suggestions = None  # PrefixIndex for the search bar, loaded on first use
 
     def close_session(self):
         self._session_cm.close_current_session()
@@ -64,15 +90,49 @@ class SqlAlchemyRepository(AbstractRepository):
             pass
         return user
 
+    def get_users(self, usernames) -> List[User]:
+        usernames = [username.lower().strip() for username in usernames]
+        if len(usernames) == 0:
+            return []
+        users = self._session_cm.session.query(User).filter(User._User__username.in_(usernames)).all()
+        users_by_name = {user.username: user for user in users}
+        # Keep the order the usernames were asked for, dropping unknown ones
+        return [users_by_name[username] for username in usernames if username in users_by_name]
+
     def add_review(self, review: Review):
         #super().add_review(review)
         with self._session_cm as scm:
             scm.session.add(review)
+            self._tally_rating(scm.session, review.game, review.rating, 1)
+            self._rank_ratings(scm.session, review.game.game_id)
             scm.commit()
 
-    def get_reviews(self, id: int):
-        reviews = self._session_cm.session.query(Review).all()
-        return reviews
+    def has_review(self, game_id: int, username: str) -> bool:
+        # One probe of the (game_id, user_id) index on reviews
+        query = self._session_cm.session.query(Review).join(Review._Review__user).filter(
+            reviews_table.c.game_id == game_id, User._User__username == username.lower().strip())
+        return self._session_cm.session.query(query.exists()).scalar()
+
+    def get_reviews(self, id: int = None):
+        query = self._session_cm.session.query(Review)
+        if id is not None:
+            query = query.filter(reviews_table.c.game_id == id)
+        return query.order_by(reviews_table.c.review_id).all()
+
+    def get_reviews_for_game(self, game_id: int, cursor=None, limit: int = 10, order: str = 'newest'):
+        # One statement, walking the game's entries in the index for the order from the cursor
+        if order == 'highest':
+            key_columns = (reviews_table.c.rating, reviews_table.c.review_id)
+        else:
+            key_columns = (reviews_table.c.review_id,)
+        query = self._session_cm.session.query(Review, *key_columns).options(
+            joinedload(Review._Review__user)).filter(reviews_table.c.game_id == game_id)
+        if cursor is not None:
+            query = query.filter(tuple_(*key_columns) < tuple_(*cursor))
+        # One more than asked for, to tell whether there is another page
+        rows = query.order_by(*(desc(column) for column in key_columns)).limit(limit + 1).all()
+        next_cursor = tuple(rows[limit - 1][1:]) if len(rows) > limit > 0 else None
+        return [row[0] for row in rows[:limit]], next_cursor
 
     def add_game_to_wishlist(self, username, game_id):
         with self._session_cm as scm:
@@ -81,6 +141,7 @@ class SqlAlchemyRepository(AbstractRepository):
             game = scm.session.query(Game).filter(Game._Game__game_id == game_id).one()
             if game not in user.favourite_games:
                 user.favourite_games.append(game)
+                self._count_wish(scm.session, game_id, 1)
                 scm.commit()
 
     def remove_game_from_wishlist(self, username, game_id):
@@ -90,8 +151,53 @@ class SqlAlchemyRepository(AbstractRepository):
             game = scm.session.query(Game).filter(Game._Game__game_id == game_id).one()
             if game in user.favourite_games:
                 user.favourite_games.remove(game)
+                self._count_wish(scm.session, game_id, -1)
                 scm.commit()
 
+    def get_top_rated_games(self, limit: int = 50):
+        scores = rankings_table.c
+        query = self._session_cm.session.query(Game, scores.average_rating).join(
+            rankings_table, scores.game_id == Game._Game__game_id).filter(scores.review_count > 0)
+        query = query.order_by(desc(scores.average_rating), desc(scores.review_count), scores.game_id)
+        return [tuple(row) for row in self._list_view(query).limit(limit).all()]
+
+    def get_most_wishlisted_games(self, limit: int = 50):
+        scores = rankings_table.c
+        query = self._session_cm.session.query(Game, scores.wishlist_count).join(
+            rankings_table, scores.game_id == Game._Game__game_id).filter(scores.wishlist_count > 0)
+        query = query.order_by(desc(scores.wishlist_count), scores.game_id)
+        return [tuple(row) for row in self._list_view(query).limit(limit).all()]
+
+    @staticmethod
+    def _tally_rating(session, game: Game, rating: int, change: int):
+        # Counts a rating in (or, with change=-1, out of) the game's totals as one UPDATE that adds to the stored
+        # values, so sessions reviewing the same game at once never overwrite each other's totals. The histogram
+        # is recounted from the reviews, which is why the review's own insert or delete is flushed first.
+        session.flush()
+        games = games_table.c
+        session.execute(games_table.update().where(games.game_id == game.game_id).values(
+            review_count=games.review_count + change, rating_sum=games.rating_sum + rating * change,
+            rating_counts=text(rating_counts_sql())))
+        session.expire(game, ['_Game__review_count', '_Game__rating_sum', '_Game__rating_counts'])
+
+    @staticmethod
+    def _rank_ratings(session, game_id: int):
+        # Copies the game's stored rating totals to its leaderboard row in SQL, in the same transaction as the
+        # review, so the row always matches the games table rather than a session's copy of it
+        games = games_table.c
+        average_rating = case((games.review_count > 0, games.rating_sum * 1.0 / games.review_count), else_=0)
+        insert = sqlite_insert(rankings_table).from_select(
+            ['game_id', 'average_rating', 'review_count'],
+            select(games.game_id, average_rating, games.review_count).where(games.game_id == game_id))
+        session.execute(insert.on_conflict_do_update(index_elements=['game_id'], set_={
+            'average_rating': insert.excluded.average_rating, 'review_count': insert.excluded.review_count}))
+
+    @staticmethod
+    def _count_wish(session, game_id, change: int):
+        session.execute(sqlite_insert(rankings_table).values(game_id=game_id, wishlist_count=max(change, 0))
+                        .on_conflict_do_update(index_elements=['game_id'], set_={
+                            'wishlist_count': rankings_table.c.wishlist_count + change}))
+
     def get_wishlist(self, username):
         with self._session_cm as scm:
             username = username.lower()
@@ -103,8 +209,24 @@ class SqlAlchemyRepository(AbstractRepository):
         languages_str = ', '.join(game.languages) if game.languages else None
         game.languages = languages_str"""
         with self._session_cm as scm:
+            # Games share the stored genres instead of inserting another copy of them; share_stored_publishers
+            # does the same for the publisher when the game is flushed
+            for index, genre in enumerate(game.genres):
+                stored_genre = scm.session.query(Genre).filter(
+                    Genre._Genre__genre_name == genre.genre_name).one_or_none()
+                if stored_genre is not None:
+                    game.genres[index] = stored_genre
             scm.session.add(game)
+            if self._search_index_available():
+                scm.session.execute(games_search_table.insert().prefix_with('OR REPLACE').values(
+                    **self._search_row(game)))
             scm.commit()
+        self._sorted_genres = None
+        if self._suggestions is not None:
+            for suggestion in self._suggestions_for(game.game_id, game.title,
+                                                    game.publisher.publisher_name if game.publisher else None,
+                                                    game.recommendations):
+                self._suggestions.add(*suggestion)
 
     def get_game(self, id: int):
         game = None
@@ -116,20 +238,257 @@ class SqlAlchemyRepository(AbstractRepository):
             pass
         return game
 
+    def add_games(self, games: Iterable[Game], progress=None, batch_size: int = 1000):
+        # Bulk load for populating the database: batched executemany inserts through Core, all committed in
+        # one transaction instead of one per game. Each publisher and genre name is inserted only once.
+        with self._session_cm as scm:
+            connection = scm.session.connection()
+            publisher_names = {name for name, in connection.execute(select(publishers_table.c.name))}
+            genre_ids = dict()
+            for genre_id, genre_name in connection.execute(
+                    select(genres_table.c.genre_id, genres_table.c.genre_name).order_by(genres_table.c.genre_id)):
+                genre_ids.setdefault(genre_name, genre_id)
+            next_genre_id = max(genre_ids.values(), default=0) + 1
+            with_search_index = self._search_index_available()
+
+            number_of_games = 0
+            batch = self._new_batch()
+            for game in games:
+                publisher_name = game.publisher.publisher_name if game.publisher is not None else None
+                if publisher_name is not None and publisher_name not in publisher_names:
+                    publisher_names.add(publisher_name)
+                    batch[publishers_table].append({'name': publisher_name})
+                batch[games_table].append(self._game_row(game, publisher_name))
+                for genre in game.genres:
+                    if genre.genre_name not in genre_ids:
+                        genre_ids[genre.genre_name] = next_genre_id
+                        batch[genres_table].append({'genre_id': next_genre_id, 'genre_name': genre.genre_name})
+                        next_genre_id += 1
+                    batch[game_genres_table].append({'game_id': game.game_id,
+                                                     'genre_id': genre_ids[genre.genre_name]})
+                if with_search_index:
+                    batch[games_search_table].append(self._search_row(game))
+
+                number_of_games += 1
+                if number_of_games % batch_size == 0:
+                    self._insert_batch(connection, batch)
+                    batch = self._new_batch()
+                    if progress is not None:
+                        progress(number_of_games)
+            self._insert_batch(connection, batch)
+            scm.commit()
+        # The last full batch has already been reported
+        if progress is not None and (number_of_games % batch_size != 0 or number_of_games == 0):
+            progress(number_of_games)
+        self._sorted_genres = None
+        self._suggestions = None
+
+    @staticmethod
+    def _new_batch():
+        # Rows waiting to be inserted, per table, in foreign key order
+        return {publishers_table: [], genres_table: [], games_table: [], game_genres_table: [],
+                games_search_table: []}
+
+    @staticmethod
+    def _insert_batch(connection, batch):
+        for table, rows in batch.items():
+            if len(rows) > 0:
+                connection.execute(table.insert(), rows)
+
+    @staticmethod
+    def _game_row(game: Game, publisher_name):
+        return {'game_id': game.game_id, 'title': game.title, 'price': game.price,
+                'release_date': game.release_date, 'game_description': game.description,
+                'game_image_url': game.image_url, 'game_website_url': game.website_url,
+                'publisher_name': publisher_name, 'recommendations': game.recommendations}
+
+    @staticmethod
+    def _search_row(game: Game):
+        return {'rowid': game.game_id,
+                'title': game.title,
+                'publisher': game.publisher.publisher_name if game.publisher is not None else None,
+                'description': game.description,
+                'tags': ', '.join(genre.genre_name for genre in game.genres)}
+
     def get_number_of_games(self):
-        number_of_games = self._session_cm.session.query(Game).count()
+        number_of_games = self._session_cm.session.query(func.count(Game._Game__game_id)).scalar()
         return number_of_games
 
-
-    # These need to be implemented but its kinda confusing atm
-
     def get_last_game(self):
-        games = self._session_cm.session.query(Game).all()
-        return games[-1]
+        return self._session_cm.session.query(Game).order_by(desc(Game._Game__game_id)).first()
 
     def get_first_game(self):
-        games = self._session_cm.session.query(Game).all()
-        return games[0]
+        return self._session_cm.session.query(Game).order_by(asc(Game._Game__game_id)).first()
+
+    def get_first_game_by_title(self, genre_name: str = None):
+        # ORDER BY title, game_id LIMIT 1, read off the start of the title index
+        games = self.get_games_after(None, 1) if genre_name is None else self.get_games_by_genre(genre_name, None, 1)
+        return games[0] if games else None
+
+    def get_last_game_by_title(self, genre_name: str = None):
+        games = self.get_games_before(None, 1) if genre_name is None else \
+            self.get_games_by_genre_before(genre_name, None, 1)
+        return games[0] if games else None
+
+    def get_games_sorted_by_title(self, start: int = 0, limit: int = None) -> List[Game]:
+        query = self._session_cm.session.query(Game).order_by(Game._Game__game_title, Game._Game__game_id)
+        return query.offset(start).limit(limit).all()
+
+    def get_title_rank(self, game_id: int):
+        game = self.get_game_id(game_id)
+        if game is None:
+            return None
+        title = Game._Game__game_title
+        return self._session_cm.session.query(Game).filter(
+            or_(title < game.title, and_(title == game.title, Game._Game__game_id < game_id))).count()
+
+    def get_games_after(self, key=None, limit: int = 5, inclusive: bool = False) -> List[Game]:
+        return self._seek_after(self._session_cm.session.query(Game), key, limit, inclusive)
+
+    def get_games_before(self, key=None, limit: int = 5) -> List[Game]:
+        return self._seek_before(self._session_cm.session.query(Game), key, limit)
+
+    def get_games_by_genre(self, genre_name: str, key=None, limit: int = 5, inclusive: bool = False) -> List[Game]:
+        return self._seek_after(self._genre_query(genre_name), key, limit, inclusive)
+
+    def get_games_by_genre_before(self, genre_name: str, key=None, limit: int = 5) -> List[Game]:
+        return self._seek_before(self._genre_query(genre_name), key, limit)
+
+    def count_games_by_genre(self, genre_name: str) -> int:
+        return self._count(self._genre_query(genre_name))
+
+    def get_games_in_price_range(self, lower_price, upper_price=None, limit: int = None) -> List[Game]:
+        # Range scan on the games.price index
+        price = Game._Game__price
+        query = self._session_cm.session.query(Game).filter(price > lower_price)
+        if upper_price is not None:
+            query = query.filter(price <= upper_price)
+        query = query.order_by(asc(price), asc(Game._Game__game_title), asc(Game._Game__game_id))
+        return self._list_view(query, price).limit(limit).all()
+
+    def search_games(self, search_query: str, search_criteria: str, genre: str = None, key=None, limit: int = None,
+                     inclusive: bool = False) -> List[Game]:
+        if not self._search_index_available():
+            games = self._scan_games(search_query, search_criteria, genre)
+            start, stop = range_after(games, key, limit, inclusive, sort_key=title_key)
+            return games[start:stop]
+        return self._seek_after(self._search_query(search_query, search_criteria, genre), key, limit, inclusive)
+
+    def search_games_before(self, search_query: str, search_criteria: str, genre: str = None, key=None,
+                            limit: int = 5) -> List[Game]:
+        if not self._search_index_available():
+            games = self._scan_games(search_query, search_criteria, genre)
+            start, stop = range_before(games, key, limit, sort_key=title_key)
+            return games[start:stop]
+        return self._seek_before(self._search_query(search_query, search_criteria, genre), key, limit)
+
+    def count_search_games(self, search_query: str, search_criteria: str, genre: str = None) -> int:
+        if not self._search_index_available():
+            return len(self._scan_games(search_query, search_criteria, genre))
+        return self._count(self._search_query(search_query, search_criteria, genre))
+
+    def get_search_suggestions(self, prefix: str, limit: int = 10):
+        if self._suggestions is None:
+            # Only the few columns the suggestions need, not whole Game objects
+            self._suggestions = PrefixIndex()
+            rows = self._session_cm.session.query(
+                games_table.c.game_id, games_table.c.title, games_table.c.publisher_name,
+                games_table.c.recommendations).all()
+            self._suggestions.add_all(suggestion for row in rows for suggestion in self._suggestions_for(*row))
+        return self._suggestions.suggest(prefix, limit)
+
+    @staticmethod
+    def _suggestions_for(game_id, title, publisher_name, recommendations):
+        # (text, kind, id, weight) of the search bar entries for a game
+        recommendations = recommendations or 0
+        if title is not None:
+            yield title, 'title', game_id, recommendations
+        if publisher_name is not None:
+            yield publisher_name, 'publisher', publisher_name, recommendations
+
+    def _search_index_available(self):
+        if self._has_search_index is None:
+            row = self._session_cm.session.execute(
+                text("SELECT 1 FROM sqlite_master WHERE name = 'games_fts'")).first()
+            self._has_search_index = row is not None
+        return self._has_search_index
+
+    def _search_query(self, search_query: str, search_criteria: str, genre: str = None):
+        if search_criteria == 'title':
+            columns = [games_search_table.c.title]
+        elif search_criteria == 'publisher':
+            columns = [games_search_table.c.publisher]
+        else:
+            columns = [games_search_table.c.title, games_search_table.c.publisher]
+
+        if len(search_query) >= 3:
+            # Column filter plus a quoted phrase, which the trigram tokenizer matches as a substring
+            phrase = '"' + search_query.replace('"', '""') + '"'
+            match = '{' + ' '.join(column.name for column in columns) + '} : ' + phrase
+            condition = text("games_fts MATCH :match").bindparams(match=match)
+        else:
+            # Too short to make a trigram, so MATCH would find nothing
+            pattern = '%' + search_query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            condition = or_(*(column.like(pattern, escape='\\') for column in columns))
+
+        query = self._session_cm.session.query(Game).join(
+            games_search_table, games_search_table.c.rowid == Game._Game__game_id).filter(condition)
+        if genre and genre != "all":
+            query = query.filter(Game._Game__genres.any(Genre._Genre__genre_name == genre))
+        return query
+
+    def _scan_games(self, search_query: str, search_criteria: str, genre: str = None) -> List[Game]:
+        search_query = search_query.lower()
+        games = self.get_games_sorted_by_title()
+        if search_criteria == 'title':
+            games = [game for game in games if search_query in game.title.lower()]
+        elif search_criteria == 'publisher':
+            games = [game for game in games if search_query in game.publisher.publisher_name.lower()]
+        else:
+            games = [game for game in games if search_query in game.title.lower() or
+                     search_query in game.publisher.publisher_name.lower()]
+        if genre and genre != "all":
+            games = [game for game in games if any(g.genre_name == genre for g in game.genres)]
+        return games
+
+    def get_unique_genres(self) -> List[Genre]:
+        if self._sorted_genres is None:
+            rows = self._session_cm.session.query(Genre._Genre__genre_name).distinct().order_by(
+                Genre._Genre__genre_name).all()
+            self._sorted_genres = [Genre(genre_name) for genre_name, in rows]
+        return self._sorted_genres
+
+    def _genre_query(self, genre_name: str):
+        return self._session_cm.session.query(Game).join(Game._Game__genres).filter(
+            Genre._Genre__genre_name == genre_name)
+
+    @staticmethod
+    def _count(query) -> int:
+        # SELECT count(...) over the query's joins, instead of Query.count() wrapping every column in a subquery
+        return query.with_entities(func.count(Game._Game__game_id)).scalar()
+
+    @staticmethod
+    def _list_view(query, *columns):
+        # Game listings only show the id, title, release date and image (plus any extra columns asked for),
+        # so the descriptions and other columns stay unloaded
+        return query.options(load_only(Game._Game__game_title, Game._Game__release_date, Game._Game__image_url,
+                                       *columns))
+
+    @classmethod
+    def _seek_after(cls, query, key, limit: int, inclusive: bool = False) -> List[Game]:
+        # Keyset seek: WHERE (title, game_id) > (?, ?) ORDER BY title, game_id LIMIT n
+        if key is not None:
+            sort_key = tuple_(Game._Game__game_title, Game._Game__game_id)
+            query = query.filter(sort_key >= tuple_(*key) if inclusive else sort_key > tuple_(*key))
+        query = query.order_by(asc(Game._Game__game_title), asc(Game._Game__game_id))
+        return cls._list_view(query).limit(limit).all()
+
+    @classmethod
+    def _seek_before(cls, query, key, limit: int) -> List[Game]:
+        if key is not None:
+            query = query.filter(tuple_(Game._Game__game_title, Game._Game__game_id) < tuple_(*key))
+        query = query.order_by(desc(Game._Game__game_title), desc(Game._Game__game_id))
+        return cls._list_view(query).limit(limit).all()[::-1]
 
     def get_game_id(self, game_id: int) -> Game:
         try:
@@ -137,6 +496,17 @@ class SqlAlchemyRepository(AbstractRepository):
         except NoResultFound:
             return None
 
+    def get_game_details(self, game_id: int) -> Game:
+        # The game with its publisher and genres, in two statements however many genres there are. The reviews
+        # are left to get_reviews_for_game, a page at a time.
+        query = self._session_cm.session.query(Game).filter(Game._Game__game_id == game_id).options(
+            joinedload(Game._Game__publisher),
+            selectinload(Game._Game__genres))
+        try:
+            return query.one()
+        except NoResultFound:
+            return None
+
     def change_password(self, user: User, password: str):
         with self._session_cm as scm:
             scm.session.query(User).filter(User._User__username == user.username).update({'_User__password': password})
@@ -149,11 +519,15 @@ class SqlAlchemyRepository(AbstractRepository):
     def remove_user(self, user: User):
         with self._session_cm as scm:
             # Delete connected reviews
-            for i in reversed(range(len(user.reviews))):
-                scm.session.delete(user.reviews[i])
+            for review in list(user.reviews):
+                game, rating = review.game, review.rating
+                scm.session.delete(review)
+                self._tally_rating(scm.session, game, rating, -1)
+                self._rank_ratings(scm.session, game.game_id)
             # Delete connected wishlists
-            for i in reversed(range(len(user.favourite_games))):
-                user.favourite_games.remove(user.favourite_games[i])
+            for game in list(user.favourite_games):
+                user.favourite_games.remove(game)
+                self._count_wish(scm.session, game.game_id, -1)
             # Delete user and commit the change
             scm.session.delete(user)
             scm.commit()
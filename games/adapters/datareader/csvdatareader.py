@@ -4,59 +4,95 @@ import os
 from games.domainmodel.model import Genre, Game, Publisher, User
 
 
+class NameRegistry:
+    """Interns objects by name, so e.g. every game in a genre shares one Genre object."""
+
+    def __init__(self, factory):
+        self.__factory = factory
+        self.__instances = dict()  # name -> the shared instance
+
+    def get(self, name):
+        key = name.strip() if isinstance(name, str) else name
+        instance = self.__instances.get(key)
+        if instance is None:
+            instance = self.__instances[key] = self.__factory(name)
+        return instance
+
+    def __len__(self):
+        return len(self.__instances)
+
+    def instances(self) -> set:
+        return set(self.__instances.values())
+
+
+def parse_count(text) -> int:
+    # Counts such as Recommendations only rank games, so a blank or malformed one counts as 0 instead of
+    # dropping the game
+    try:
+        return max(int(text), 0)
+    except (TypeError, ValueError):
+        return 0
+
+
 class GameFileCSVReader:
     def __init__(self, filename):
         self.__filename = filename
         self.__dataset_of_games = []
-        self.__dataset_of_publishers = set()
-        self.__dataset_of_genres = set()
+        self.__publishers = NameRegistry(Publisher)
+        self.__genres = NameRegistry(Genre)
 
     def read_csv_file(self):
+        for game in self.iter_games():
+            self.__dataset_of_games.append(game)
+
+    def iter_games(self):
+        # Yields each game as soon as its row is parsed, without keeping them in dataset_of_games.
+        # Publishers and genres are still collected, one shared object per name, since there are few of them.
         if not os.path.exists(self.__filename):
             print(f"path {self.__filename} does not exist!")
             return
         with open(self.__filename, 'r', encoding='utf-8-sig') as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                try:
-                    game_id = int(row["AppID"])
-                    title = row["Name"]
-                    game = Game(game_id, title)
-                    game.release_date = row["Release date"]
-                    game.price = float(row["Price"])
-                    game.description = row["About the game"]
-                    game.image_url = row["Header image"]
-                    publisher = Publisher(row["Publishers"])
-                    self.__dataset_of_publishers.add(publisher)
-                    game.publisher = publisher
-                    game.review = str(row["Reviews"])
-
-                    """languages_str = row["Supported languages"]
-                    languages_str = languages_str.replace('[', '').replace(']', '').replace("'", '')
-                    languages_list = [language.strip() for language in languages_str.split(",")]
-                    game.languages = languages_list"""
-
-                    genre_names = row["Genres"].split(",")
-                    for genre_name in genre_names:
-                        genre = Genre(genre_name.strip())
-                        self.__dataset_of_genres.add(genre)
-                        game.add_genre(genre)
-
-                    self.__dataset_of_games.append(game)
-
-                except ValueError as e:
-                    print(f"Skipping row due to invalid data: {e}")
-                except KeyError as e:
-                    print(f"Skipping row due to missing key: {e}")
+            yield from self.parse_rows(csv.DictReader(file))
+
+    def parse_rows(self, rows):
+        # Turns csv.DictReader rows into games, skipping rows with invalid data
+        for row in rows:
+            try:
+                game_id = int(row["AppID"])
+                title = row["Name"]
+                game = Game(game_id, title)
+                game.release_date = row["Release date"]
+                game.price = float(row["Price"])
+                game.description = row["About the game"]
+                game.image_url = row["Header image"]
+                game.recommendations = parse_count(row.get("Recommendations"))
+                game.publisher = self.__publishers.get(row["Publishers"])
+
+                """languages_str = row["Supported languages"]
+                languages_str = languages_str.replace('[', '').replace(']', '').replace("'", '')
+                languages_list = [language.strip() for language in languages_str.split(",")]
+                game.languages = languages_list"""
+
+                genre_names = row["Genres"].split(",")
+                for genre_name in genre_names:
+                    game.add_genre(self.__genres.get(genre_name.strip()))
+
+            except ValueError as e:
+                print(f"Skipping row due to invalid data: {e}")
+                continue
+            except KeyError as e:
+                print(f"Skipping row due to missing key: {e}")
+                continue
+            yield game
 
     def get_unique_games_count(self):
         return len(self.__dataset_of_games)
 
     def get_unique_genres_count(self):
-        return len(self.__dataset_of_genres)
+        return len(self.__genres)
 
     def get_unique_publishers_count(self):
-        return len(self.__dataset_of_publishers)
+        return len(self.__publishers)
 
     @property
     def dataset_of_games(self) -> list:
@@ -64,11 +100,11 @@ class GameFileCSVReader:
 
     @property
     def dataset_of_publishers(self) -> set:
-        return self.__dataset_of_publishers
+        return self.__publishers.instances()
 
     @property
     def dataset_of_genres(self) -> set:
-        return self.__dataset_of_genres
+        return self.__genres.instances()
 
 class UserFileCSVReader:
     def __init__(self, filename):
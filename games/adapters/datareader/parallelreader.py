@@ -0,0 +1,125 @@
+import csv
+import io
+import mmap
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from games.domainmodel.model import Genre, Publisher
+from games.adapters.datareader.csvdatareader import GameFileCSVReader, NameRegistry
+from games.adapters.datareader.snapshot import game_to_row, row_to_game
+
+
+def record_boundaries(filename, chunk_bytes: int) -> list:
+    # Byte offsets that split the file into chunks of whole records, the first one just after the header.
+    # A newline only ends a record outside quotes, i.e. when an even number of quote characters comes before
+    # it ("" escapes a quote, so it never changes the parity), since quoted fields can span several lines.
+    if os.path.getsize(filename) == 0:
+        return []
+    boundaries = []
+    with open(filename, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        size = len(data)
+
+        def count_quotes(start, stop):
+            # Counted a block at a time, so a huge file is never copied into memory at once
+            return sum(data[block:min(block + chunk_bytes, stop)].count(b'"')
+                       for block in range(start, stop, chunk_bytes))
+
+        quotes = 0  # quote characters before position
+        position = 0
+        target = 0  # the next boundary is the first record end past this
+        while True:
+            newline = data.find(b'\n', position)
+            if newline == -1:
+                break
+            quotes += count_quotes(position, newline)
+            position = newline + 1
+            if quotes % 2 == 0 and position > target:
+                boundaries.append(position)
+                target = position + chunk_bytes
+                if target >= size:
+                    break
+                # Jump to near the next boundary instead of visiting every record on the way
+                quotes += count_quotes(position, target)
+                position = target
+    if len(boundaries) == 0 or boundaries[-1] < size:
+        boundaries.append(size)
+    return boundaries
+
+
+def parse_chunk(filename, fieldnames, start: int, stop: int):
+    # Runs in a worker process: parses the records in [start, stop) and returns them as a snapshot chunk,
+    # (publisher names, genre names, rows), numbering publishers and genres within the chunk
+    with open(filename, 'rb') as file:
+        file.seek(start)
+        text = file.read(stop - start).decode('utf-8')
+    # Same newline translation as reading the file in text mode
+    text = text.replace('\r\n', '\n').replace('\r', '\n')
+    reader = GameFileCSVReader(filename)
+    chunk = ([], [], [])
+    publisher_index = dict()
+    genre_index = dict()
+    for game in reader.parse_rows(csv.DictReader(io.StringIO(text), fieldnames=fieldnames)):
+        chunk[2].append(game_to_row(game, publisher_index, genre_index, chunk))
+    return chunk
+
+
+class ParallelGameFileCSVReader:
+    """Reads the same dataset as GameFileCSVReader, parsing chunks of the file in a pool of processes.
+
+    The file is split on record boundaries and the chunks are merged in file order, so games, publishers and
+    genres come out exactly as the single process reader produces them.
+    """
+
+    CHUNK_BYTES = 4 * 1024 * 1024
+
+    def __init__(self, filename, processes: int = None, chunk_bytes: int = None):
+        self.__filename = filename
+        self.__processes = processes
+        self.__chunk_bytes = chunk_bytes or self.CHUNK_BYTES
+        self.__dataset_of_games = []
+        self.__publishers = NameRegistry(Publisher)
+        self.__genres = NameRegistry(Genre)
+
+    def read_csv_file(self):
+        for game in self.iter_games():
+            self.__dataset_of_games.append(game)
+
+    def iter_games(self):
+        if not os.path.exists(self.__filename):
+            print(f"path {self.__filename} does not exist!")
+            return
+        boundaries = record_boundaries(self.__filename, self.__chunk_bytes)
+        with open(self.__filename, 'r', encoding='utf-8-sig') as file:
+            fieldnames = next(csv.reader(file), None)
+        if fieldnames is None:
+            return
+        chunks = len(boundaries) - 1
+        with ProcessPoolExecutor(self.__processes) as executor:
+            # map returns the chunks in file order, however the workers finish
+            for publisher_names, genre_names, rows in executor.map(
+                    parse_chunk, [self.__filename] * chunks, [fieldnames] * chunks, boundaries[:-1], boundaries[1:]):
+                publishers = [self.__publishers.get(name) for name in publisher_names]
+                genres = [self.__genres.get(name) for name in genre_names]
+                for row in rows:
+                    yield row_to_game(row, publishers, genres)
+
+    def get_unique_games_count(self):
+        return len(self.__dataset_of_games)
+
+    def get_unique_genres_count(self):
+        return len(self.__genres)
+
+    def get_unique_publishers_count(self):
+        return len(self.__publishers)
+
+    @property
+    def dataset_of_games(self) -> list:
+        return self.__dataset_of_games
+
+    @property
+    def dataset_of_publishers(self) -> set:
+        return self.__publishers.instances()
+
+    @property
+    def dataset_of_genres(self) -> set:
+        return self.__genres.instances()
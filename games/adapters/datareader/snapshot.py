@@ -0,0 +1,189 @@
+import hashlib
+import os
+import pickle
+import tempfile
+
+from games.domainmodel.model import Genre, Game, Publisher
+from games.adapters.datareader.csvdatareader import GameFileCSVReader
+
+
+def game_to_row(game: Game, publisher_index: dict, genre_index: dict, chunk) -> tuple:
+    # Flattens a game into a tuple, numbering publishers and genres by first appearance. Names seen for the
+    # first time are appended to chunk[0] and chunk[1].
+    publisher = None
+    if game.publisher is not None:
+        name = game.publisher.publisher_name
+        if name not in publisher_index:
+            publisher_index[name] = len(publisher_index)
+            chunk[0].append(name)
+        publisher = publisher_index[name]
+    genres = []
+    for genre in game.genres:
+        if genre.genre_name not in genre_index:
+            genre_index[genre.genre_name] = len(genre_index)
+            chunk[1].append(genre.genre_name)
+        genres.append(genre_index[genre.genre_name])
+    return (game.game_id, game.title, game.price, game.release_date, game.description, game.image_url,
+            game.website_url, game.recommendations, publisher, tuple(genres))
+
+
+def row_to_game(row, publishers: list, genres: list) -> Game:
+    # Inverse of game_to_row, with publishers and genres holding the objects for each number
+    game_id, title, price, release_date, description, image_url, website_url, recommendations, publisher, \
+        genre_indexes = row
+    game = Game(game_id, title)
+    # The values were validated when the CSV was read, so set them without running the setters again
+    game._Game__price = price
+    game._Game__release_date = release_date
+    game._Game__description = description
+    game._Game__image_url = image_url
+    game._Game__website_url = website_url
+    game._Game__recommendations = recommendations
+    if publisher is not None:
+        game._Game__publisher = publishers[publisher]
+    for genre in genre_indexes:
+        game.genres.append(genres[genre])
+    return game
+
+
+class GameSnapshotFile:
+    """Compiled copy of games.csv that loads without re-parsing and re-validating every row.
+
+    The file starts with a header naming the format version and the size, mtime and SHA-256 of the CSV it was
+    built from, followed by the games as plain tuples in chunks, so it can be read and written as a stream.
+    It is fresh while the CSV's size and mtime still match, or while its hash does when only the mtime has moved
+    (e.g. after a fresh checkout).
+    """
+
+    MAGIC = b'GAMESNAP'
+    VERSION = 2
+    CHUNK_SIZE = 1000
+
+    # Results of freshness()
+    FRESH = 'fresh'
+    MOVED = 'moved'  # same contents, but the CSV's mtime changed so the header needs rewriting
+    STALE = 'stale'
+
+    def __init__(self, csv_filename, snapshot_filename=None, reader_class=GameFileCSVReader):
+        self.__csv_filename = csv_filename
+        self.__snapshot_filename = snapshot_filename or csv_filename + '.snapshot'
+        self.__reader_class = reader_class  # parses the CSV when the snapshot is stale
+
+    @property
+    def snapshot_filename(self):
+        return self.__snapshot_filename
+
+    def load_games(self) -> list:
+        return list(self.iter_games())
+
+    def iter_games(self):
+        # Games from the snapshot when it is fresh, otherwise from the CSV, writing a new snapshot as they go past
+        freshness = self.freshness()
+        if freshness == self.FRESH:
+            yield from self._read_games()
+        elif freshness == self.MOVED:
+            yield from self._write_games(self._read_games())
+        else:
+            yield from self._write_games(self.__reader_class(self.__csv_filename).iter_games())
+
+    def freshness(self) -> str:
+        try:
+            with open(self.__snapshot_filename, 'rb') as file:
+                header = self._read_header(file)
+            if header is None:
+                return self.STALE
+            source = self._source()
+            if (header['size'], header['mtime_ns']) == (source['size'], source['mtime_ns']):
+                return self.FRESH
+            if header['size'] == source['size'] and header['sha256'] == self._hash():
+                return self.MOVED
+        except (OSError, EOFError, KeyError, TypeError, ValueError, pickle.UnpicklingError):
+            pass
+        return self.STALE
+
+    def _read_header(self, file):
+        if file.read(len(self.MAGIC)) != self.MAGIC:
+            return None
+        header = pickle.load(file)
+        if header.get('version') != self.VERSION:
+            return None
+        return header
+
+    def _read_games(self):
+        # Each chunk brings the publisher and genre names first seen in it, followed by its rows
+        publishers = []
+        genres = []
+        with open(self.__snapshot_filename, 'rb') as file:
+            self._read_header(file)
+            while True:
+                try:
+                    publisher_names, genre_names, rows = pickle.load(file)
+                except EOFError:
+                    return
+                # One Publisher and Genre object per name, shared by the games
+                publishers.extend(Publisher(name) for name in publisher_names)
+                genres.extend(Genre(name) for name in genre_names)
+                for row in rows:
+                    yield row_to_game(row, publishers, genres)
+
+    def _write_games(self, games):
+        # Passes the games through while writing them to a temporary file, which replaces the snapshot once
+        # every game has been written, so other workers never read a half written snapshot. Failing to write
+        # only costs the next start a parse, so the games keep coming either way.
+        if not os.path.exists(self.__csv_filename):
+            yield from games  # The reader reports the missing CSV, and there is nothing to take a snapshot of
+            return
+        directory = os.path.dirname(os.path.abspath(self.__snapshot_filename))
+        try:
+            descriptor, temporary_filename = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        except OSError:
+            yield from games  # Read-only deployments just parse the CSV every time
+            return
+        file = os.fdopen(descriptor, 'wb')
+        finished = False
+        try:
+            writing = self._dump(file, dict(self._source(), version=self.VERSION, sha256=self._hash()), self.MAGIC)
+            publisher_index = dict()
+            genre_index = dict()
+            chunk = ([], [], [])
+            for game in games:
+                if writing:
+                    chunk[2].append(game_to_row(game, publisher_index, genre_index, chunk))
+                    if len(chunk[2]) == self.CHUNK_SIZE:
+                        writing = self._dump(file, chunk)
+                        chunk = ([], [], [])
+                yield game
+            if writing and len(chunk[2]) > 0:
+                writing = self._dump(file, chunk)
+            try:
+                file.close()
+                if writing:
+                    os.replace(temporary_filename, self.__snapshot_filename)
+                    finished = True
+            except OSError:
+                pass
+        finally:
+            # Stopped early or failed to write, so leave the old snapshot alone
+            file.close()
+            if not finished and os.path.exists(temporary_filename):
+                os.remove(temporary_filename)
+
+    @staticmethod
+    def _dump(file, value, prefix=b'') -> bool:
+        try:
+            file.write(prefix)
+            pickle.dump(value, file, pickle.HIGHEST_PROTOCOL)
+            return True
+        except OSError:
+            return False
+
+    def _source(self):
+        stat = os.stat(self.__csv_filename)
+        return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+    def _hash(self):
+        sha256 = hashlib.sha256()
+        with open(self.__csv_filename, 'rb') as file:
+            for block in iter(lambda: file.read(1 << 20), b''):
+                sha256.update(block)
+        return sha256.hexdigest()
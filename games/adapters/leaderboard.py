@@ -0,0 +1,38 @@
+from bisect import bisect_left, insort_left
+from typing import Dict, Hashable, List, Tuple
+
+
+class Leaderboard:
+    """Items ranked by a score, highest first, for the memory repository's leaderboards.
+
+    Scores are tuples of numbers compared in order, e.g. (average rating, number of reviews). The entries are kept
+    in a sorted array of negated scores, so moving an item after its score changes is two bisects, and the top k
+    is a slice of the front of the array.
+    """
+
+    def __init__(self):
+        self._entries: List[tuple] = []  # (negated score, item id), sorted, so the best item comes first
+        self._scores: Dict[Hashable, tuple] = dict()  # item id -> score
+
+    def __len__(self):
+        return len(self._entries)
+
+    def score(self, item_id: Hashable):
+        return self._scores.get(item_id)
+
+    def update(self, item_id: Hashable, score: tuple = None):
+        # Moves the item to its place for the new score; a score of None takes it off the board
+        old_score = self._scores.pop(item_id, None)
+        if old_score is not None:
+            del self._entries[bisect_left(self._entries, (self._negate(old_score), item_id))]
+        if score is not None:
+            self._scores[item_id] = score
+            insort_left(self._entries, (self._negate(score), item_id))
+
+    def top(self, limit: int) -> List[Tuple[Hashable, tuple]]:
+        # (item id, score) of the best limit items; ties go to the smaller id
+        return [(item_id, self._scores[item_id]) for _, item_id in self._entries[:limit]]
+
+    @staticmethod
+    def _negate(score: tuple) -> tuple:
+        return tuple(-value for value in score)
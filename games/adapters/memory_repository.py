@@ -1,20 +1,99 @@
 import os.path
-from bisect import insort_left
-from typing import List
-from games.adapters.repository import AbstractRepository
-from games.domainmodel.model import Game, User, Review
+from bisect import insort_left, bisect_left, bisect_right
+from typing import Iterable, List
+from games.adapters.repository import AbstractRepository, title_key, range_after, range_before, REVIEW_ORDERS, \
+    review_key
+from games.domainmodel.model import Game, User, Review, Genre
 from games.adapters.datareader.csvdatareader import GameFileCSVReader, UserFileCSVReader
+from games.adapters.trigram_index import TrigramIndex
+from games.adapters.prefix_index import PrefixIndex
+from games.adapters.leaderboard import Leaderboard
+
+
+def price_key(game: Game):
+    # Sort key of the price-ordered view; ties in price are listed in title order
+    return game.price, game.title or "", game.game_id
+
+
+def _append(items: list, item, key=None):
+    # insort_left's signature, for adding to a view that is sorted afterwards
+    items.append(item)
+
 
 class MemoryRepository(AbstractRepository):
 
     def __init__(self):
         self._games = list()
+        self._games_index = dict()  # game_id -> Game, kept alongside the sorted list for O(1) lookups
+        self._games_by_title = list()  # catalog ordered by title_key for browsing, searched with bisect on the key
+        self._games_by_price = list()  # priced games ordered by price_key for the home shelves
+        self._genre_index = dict()  # genre name -> posting list of (title, game_id) keys in title order
+        self._title_search = TrigramIndex()  # game_id -> title
+        self._publisher_search = TrigramIndex()  # publisher name -> publisher name
+        self._games_by_publisher = dict()  # publisher name -> ids of the publisher's games
+        self._last_search = (None, None)  # (search arguments, games in title order) of the most recent search
+        self._suggestions = PrefixIndex()  # titles and publisher names for the search bar, by recommendations
+        self._genres = dict()  # genre name -> Genre, every distinct genre in the catalog
+        self._genres_version = 0  # bumped whenever add_game brings in a new genre
+        self._sorted_genres = (-1, [])  # (version it was built at, sorted genres) for the sidebar
         self._users = list()
+        self._users_index = dict()  # case-folded username -> User
         self._reviews = list()
+        self._reviewers = dict()  # (game_id, username) -> number of reviews the user has written for the game
+        self._game_reviews = dict()  # game_id -> order -> (negated review keys in ascending order, reviews)
+        self._reviews_added = 0  # numbers the reviews for the review keys
+        self._top_rated = Leaderboard()  # game_id by (average rating, number of reviews)
+        self._most_wishlisted = Leaderboard()  # game_id by (number of wishlists it is on,)
 
     def add_game(self, game: Game):
         if isinstance(game, Game):
-            insort_left(self._games, game)
+            self._index_game(game, insort_left, self._suggestions.add)
+            self._last_search = (None, None)
+
+    def add_games(self, games: Iterable[Game], progress=None, batch_size: int = 1000):
+        # Games are appended to the views, which are sorted once at the end rather than one insort per game
+        suggestions = []
+        number_of_games = 0
+        for game in games:
+            if isinstance(game, Game):
+                self._index_game(game, _append, lambda *suggestion: suggestions.append(suggestion))
+            number_of_games += 1
+            if progress is not None and number_of_games % batch_size == 0:
+                progress(number_of_games)
+        self._games.sort(key=Game.game_id.fget)
+        self._games_by_title.sort(key=title_key)
+        self._games_by_price.sort(key=price_key)
+        for postings in self._genre_index.values():
+            postings.sort()
+        self._suggestions.add_all(suggestions)
+        self._last_search = (None, None)
+        # The last full batch has already been reported
+        if progress is not None and (number_of_games % batch_size != 0 or number_of_games == 0):
+            progress(number_of_games)
+
+    def _index_game(self, game: Game, place, suggest):
+        # Adds the game to every view with place(view, item, key=...), i.e. insort_left or _append, and its title
+        # and publisher to the search bar with suggest(text, kind, id, weight)
+        place(self._games, game)
+        self._games_index[game.game_id] = game
+        place(self._games_by_title, game, key=title_key)
+        if game.price is not None:
+            place(self._games_by_price, game, key=price_key)
+        if game.title is not None:
+            self._title_search.add(game.game_id, game.title)
+            suggest(game.title, 'title', game.game_id, game.recommendations)
+        if game.publisher is not None and game.publisher.publisher_name is not None:
+            publisher_name = game.publisher.publisher_name
+            if publisher_name not in self._games_by_publisher:
+                self._publisher_search.add(publisher_name, publisher_name)
+            self._games_by_publisher.setdefault(publisher_name, set()).add(game.game_id)
+            suggest(publisher_name, 'publisher', publisher_name, game.recommendations)
+        key = title_key(game)
+        for genre in game.genres:
+            place(self._genre_index.setdefault(genre.genre_name, []), key)
+            if genre.genre_name not in self._genres:
+                self._genres[genre.genre_name] = genre
+                self._genres_version += 1
 
     def get_number_of_games(self):
         return len(self._games)
@@ -22,25 +101,132 @@ class MemoryRepository(AbstractRepository):
     def get_games(self) -> List[Game]:
         return self._games
 
+    def get_games_sorted_by_title(self, start: int = 0, limit: int = None) -> List[Game]:
+        stop = None if limit is None else start + limit
+        return self._games_by_title[start:stop]
+
+    def get_title_rank(self, game_id: int):
+        # Position of the game in the title-ordered view, found by bisect on its sort key
+        game = self._games_index.get(game_id)
+        if game is None:
+            return None
+        return bisect_left(self._games_by_title, title_key(game), key=title_key)
+
+    def get_games_after(self, key=None, limit: int = 5, inclusive: bool = False) -> List[Game]:
+        start, stop = range_after(self._games_by_title, key, limit, inclusive, sort_key=title_key)
+        return self._games_by_title[start:stop]
+
+    def get_games_before(self, key=None, limit: int = 5) -> List[Game]:
+        start, stop = range_before(self._games_by_title, key, limit, sort_key=title_key)
+        return self._games_by_title[start:stop]
+
+    def get_games_by_genre(self, genre_name: str, key=None, limit: int = 5, inclusive: bool = False) -> List[Game]:
+        postings = self._genre_index.get(genre_name, [])
+        start, stop = range_after(postings, key, limit, inclusive)
+        return [self._games_index[game_id] for _, game_id in postings[start:stop]]
+
+    def get_games_by_genre_before(self, genre_name: str, key=None, limit: int = 5) -> List[Game]:
+        postings = self._genre_index.get(genre_name, [])
+        start, stop = range_before(postings, key, limit)
+        return [self._games_index[game_id] for _, game_id in postings[start:stop]]
+
+    def count_games_by_genre(self, genre_name: str) -> int:
+        return len(self._genre_index.get(genre_name, []))
+
+    def get_games_in_price_range(self, lower_price, upper_price=None, limit: int = None) -> List[Game]:
+        start = bisect_right(self._games_by_price, lower_price, key=Game.price.fget)
+        stop = len(self._games_by_price) if upper_price is None else \
+            bisect_right(self._games_by_price, upper_price, key=Game.price.fget)
+        if limit is not None:
+            stop = min(stop, start + limit)
+        return self._games_by_price[start:stop]
+
+    def search_games(self, search_query: str, search_criteria: str, genre: str = None, key=None, limit: int = None,
+                     inclusive: bool = False) -> List[Game]:
+        games = self._search(search_query, search_criteria, genre)
+        start, stop = range_after(games, key, limit, inclusive, sort_key=title_key)
+        return games[start:stop]
+
+    def search_games_before(self, search_query: str, search_criteria: str, genre: str = None, key=None,
+                            limit: int = 5) -> List[Game]:
+        games = self._search(search_query, search_criteria, genre)
+        start, stop = range_before(games, key, limit, sort_key=title_key)
+        return games[start:stop]
+
+    def count_search_games(self, search_query: str, search_criteria: str, genre: str = None) -> int:
+        return len(self._search(search_query, search_criteria, genre))
+
+    def get_search_suggestions(self, prefix: str, limit: int = 10):
+        return self._suggestions.suggest(prefix, limit)
+
+    def _search(self, search_query: str, search_criteria: str, genre: str = None):
+        # A search page asks for the count, the page and its neighbours, so keep the last result around
+        arguments = (search_query, search_criteria, genre)
+        if self._last_search[0] == arguments:
+            return self._last_search[1]
+
+        if search_criteria == 'title':
+            game_ids = self._title_search.search(search_query)
+        elif search_criteria == 'publisher':
+            game_ids = self._search_publishers(search_query)
+        else:
+            game_ids = self._title_search.search(search_query) | self._search_publishers(search_query)
+        games = [self._games_index[game_id] for game_id in game_ids]
+        if genre and genre != "all":
+            games = [game for game in games if any(g.genre_name == genre for g in game.genres)]
+        games.sort(key=title_key)
+
+        self._last_search = (arguments, games)
+        return games
+
+    def _search_publishers(self, search_query: str):
+        game_ids = set()
+        for publisher_name in self._publisher_search.search(search_query):
+            game_ids |= self._games_by_publisher[publisher_name]
+        return game_ids
+
+    def get_unique_genres(self) -> List[Genre]:
+        version, genres = self._sorted_genres
+        if version != self._genres_version:
+            genres = sorted(self._genres.values())
+            self._sorted_genres = (self._genres_version, genres)
+        return genres
+
     def get_first_game(self):
         return self._games[0]
 
     def get_last_game(self):
         return self._games[-1]
 
+    def get_first_game_by_title(self, genre_name: str = None):
+        if genre_name is None:
+            return self._games_by_title[0] if self._games_by_title else None
+        postings = self._genre_index.get(genre_name)
+        return self._games_index[postings[0][1]] if postings else None
+
+    def get_last_game_by_title(self, genre_name: str = None):
+        if genre_name is None:
+            return self._games_by_title[-1] if self._games_by_title else None
+        postings = self._genre_index.get(genre_name)
+        return self._games_index[postings[-1][1]] if postings else None
+
     def get_game_id(self, game_id: int) -> Game:
-        for game in self._games:
-            if game.game_id == game_id:
-                return game
-        return None
+        return self._games_index.get(game_id)
+
+    def get_game_details(self, game_id: int) -> Game:
+        return self._games_index.get(game_id)
 
     def add_user(self, user: User):
         if isinstance(user, User):
             self._users.append(user)
+            self._users_index.setdefault(user.username, user)
 
     def get_user(self, username):
-        username = username.lower().strip()
-        return next((user for user in self._users if user.username == username), None)
+        return self._users_index.get(username.lower().strip())
+
+    def get_users(self, usernames) -> List[User]:
+        users = (self.get_user(username) for username in usernames)
+        return [user for user in users if user is not None]
 
     def change_password(self, user: User, password: str):
         user.password = password
@@ -54,7 +240,13 @@ class MemoryRepository(AbstractRepository):
                 user.remove_review(review)
                 game.remove_review(review)
                 self._reviews.remove(review)
+                self._forget_reviewer(game.game_id, user.username)
+                self._unlist_review(review)
+                self._rank_ratings(game)
+        for game in user.favourite_games:
+            self._count_wish(game.game_id, -1)
         self._users.remove(user)
+        self._users_index.pop(user.username, None)
 
 
     def add_review(self, review: Review):
@@ -64,11 +256,45 @@ class MemoryRepository(AbstractRepository):
         game.add_review(review)
         user = review.user
         user.add_review(review)
-        print(self._reviews)
+        key = (game.game_id, user.username)
+        self._reviewers[key] = self._reviewers.get(key, 0) + 1
+        self._reviews_added += 1
+        orders = self._game_reviews.setdefault(game.game_id, {order: ([], []) for order in REVIEW_ORDERS})
+        for order, (keys, reviews) in orders.items():
+            sort_key = tuple(-value for value in review_key(order, review.rating, self._reviews_added))
+            position = bisect_left(keys, sort_key)
+            keys.insert(position, sort_key)
+            reviews.insert(position, review)
+        self._rank_ratings(game)
 
     def get_reviews(self):
         return self._reviews
 
+    def get_reviews_for_game(self, game_id: int, cursor=None, limit: int = 10, order: str = 'newest'):
+        if game_id not in self._game_reviews:
+            return [], None
+        keys, reviews = self._game_reviews[game_id][order]
+        start, stop = range_after(keys, None if cursor is None else tuple(-value for value in cursor), limit)
+        next_cursor = tuple(-value for value in keys[stop - 1]) if start < stop < len(keys) else None
+        return reviews[start:stop], next_cursor
+
+    def _unlist_review(self, review: Review):
+        orders = self._game_reviews.get(review.game.game_id, {})
+        for keys, reviews in orders.values():
+            kept = [(key, listed) for key, listed in zip(keys, reviews) if listed is not review]
+            keys[:] = [key for key, _ in kept]
+            reviews[:] = [listed for _, listed in kept]
+
+    def has_review(self, game_id: int, username: str) -> bool:
+        return (game_id, username.lower().strip()) in self._reviewers
+
+    def _forget_reviewer(self, game_id, username):
+        key = (game_id, username)
+        if self._reviewers.get(key, 0) > 1:
+            self._reviewers[key] -= 1
+        else:
+            self._reviewers.pop(key, None)
+
     def get_wishlist(self, username) -> list[Game]:
         user = self.get_user(username)
         return user.favourite_games
@@ -76,11 +302,33 @@ class MemoryRepository(AbstractRepository):
     def add_game_to_wishlist(self, username, game_id):
         game = self.get_game_id(game_id)
         user = self.get_user(username)
-        user.favourite_games.append(game)
+        if game is not None and not user.has_favourite(game_id):
+            user.favourite_games.append(game)
+            self._count_wish(game_id, 1)
 
     def remove_game_from_wishlist(self, username, game_id):
         user = self.get_user(username)
         game = self.get_game_id(game_id)
-        user.favourite_games.remove(game)
+        if user.has_favourite(game_id):
+            user.favourite_games.remove(game)
+            self._count_wish(game_id, -1)
+
+    def get_top_rated_games(self, limit: int = 50):
+        return [(self._games_index[game_id], average_rating)
+                for game_id, (average_rating, _) in self._top_rated.top(limit)]
+
+    def get_most_wishlisted_games(self, limit: int = 50):
+        return [(self._games_index[game_id], count) for game_id, (count,) in self._most_wishlisted.top(limit)]
+
+    def _rank_ratings(self, game: Game):
+        # Only games in the catalog go on the leaderboards
+        if game.game_id in self._games_index:
+            score = (game.average_rating, game.review_count) if game.review_count > 0 else None
+            self._top_rated.update(game.game_id, score)
+
+    def _count_wish(self, game_id, change: int):
+        if game_id in self._games_index:
+            count = (self._most_wishlisted.score(game_id) or (0,))[0] + change
+            self._most_wishlisted.update(game_id, (count,) if count > 0 else None)
 
 # Code that used for populating has moved to repository_populate.py
\ No newline at end of file
@@ -1,28 +1,53 @@
 from sqlalchemy import (
-    Table, MetaData, Column, Integer, String, Date, DateTime, ForeignKey, Text, Float
+    Table, MetaData, Column, Integer, String, Date, DateTime, ForeignKey, Text, Float, Index, text, inspect, bindparam
 )
+from sqlalchemy import event
+from sqlalchemy.types import TypeDecorator
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import mapper, relationship
+from functools import partial
+from typing import Iterable
+import types
 
-from games.domainmodel.model import User, Publisher, Game, Wishlist, Genre, Review
+from games.domainmodel.model import User, Publisher, Game, Wishlist, Genre, Review, OrderedSet
 
 metadata = MetaData()
 
+
+class RatingCounts(TypeDecorator):
+    # Game.rating_counts, a tuple of six counts, stored as comma separated text
+    impl = String(64)
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return ','.join(str(count) for count in (value or Game.NO_RATINGS))
+
+    def process_result_value(self, value, dialect):
+        if not value:
+            return Game.NO_RATINGS
+        return tuple(int(count) for count in value.split(','))
+
+
 publishers_table = Table(
     'publishers', metadata,
-    Column('name', String(255), nullable=True),
-    Column('publisher_id', Integer, primary_key=True)# nullable=False, unique=True)
+    Column('name', String(255), nullable=True, unique=True, index=True),
+    Column('publisher_id', Integer, primary_key=True)
 )
 
 games_table = Table(
     'games', metadata,
     Column('game_id', Integer, primary_key=True),
-    Column('title', String(255), nullable=False),
-    Column('price', Float, nullable=False),
+    Column('title', String(255), nullable=False, index=True),
+    Column('price', Float, nullable=False, index=True),
     Column('release_date', String(50), nullable=False),
     Column('game_description', String(255), nullable=True),
     Column('game_image_url', String(255), nullable=True),
     Column('game_website_url', String(255), nullable=True),
     Column('languages', String(255), nullable=True),
+    Column('recommendations', Integer, nullable=True),
+    Column('review_count', Integer, nullable=False, default=0, server_default='0'),
+    Column('rating_sum', Integer, nullable=False, default=0, server_default='0'),
+    Column('rating_counts', RatingCounts, nullable=False, default=Game.NO_RATINGS, server_default='0,0,0,0,0,0'),
     Column('publisher_name', ForeignKey('publishers.name')),
     Column('genres', ForeignKey('genres.genre_id')),
 )
@@ -31,14 +56,13 @@ genres_table = Table(
     'genres', metadata,
     # For genre again we only have name.
     Column('genre_id', Integer, primary_key = True, autoincrement=True),
-    Column('genre_name', String(64), nullable=False)
+    Column('genre_name', String(64), nullable=False, unique=True, index=True)
 )
 
 game_genres_table = Table(
     'game_genres', metadata,
-    Column('id', Integer, primary_key=True, autoincrement=True),
-    Column('game_id', ForeignKey('games.game_id')),
-    Column('genre_id', ForeignKey('genres.genre_id'))
+    Column('game_id', ForeignKey('games.game_id'), primary_key=True),
+    Column('genre_id', ForeignKey('genres.genre_id'), primary_key=True, index=True)
 )
 
 users_table = Table(
@@ -53,16 +77,180 @@ reviews_table = Table(
     Column('game_id', ForeignKey('games.game_id')),
     Column('comment', String(255), nullable=False),
     Column('rating', Integer, nullable=False),
-    Column('user_id', ForeignKey('users.user_id'))
-
+    Column('user_id', ForeignKey('users.user_id'), index=True),
+    # Finds a game's reviews, and whether a user has already reviewed the game
+    Index('ix_reviews_game_id_user_id', 'game_id', 'user_id'),
+    # A game's reviews newest first and highest rated first, for paging through them
+    Index('ix_reviews_game_id_review_id', 'game_id', 'review_id'),
+    Index('ix_reviews_game_id_rating', 'game_id', 'rating', 'review_id')
 )
 
 user_favourite_games_table = Table(
     'user_favourite_games', metadata,
-    Column('user_id', Integer, ForeignKey('users.user_id')),
-    Column('game_id', Integer, ForeignKey('games.game_id'))
+    Column('user_id', Integer, ForeignKey('users.user_id'), primary_key=True),
+    Column('game_id', Integer, ForeignKey('games.game_id'), primary_key=True, index=True)
+)
+
+# Materialized leaderboard figures for the games that have reviews or wishlist entries, kept up to date by the
+# repository as those change. Each leaderboard's order has an index, so its top k are its first k entries.
+rankings_table = Table(
+    'rankings', metadata,
+    Column('game_id', ForeignKey('games.game_id'), primary_key=True),
+    Column('average_rating', Float, nullable=False, default=0),
+    Column('review_count', Integer, nullable=False, default=0),
+    Column('wishlist_count', Integer, nullable=False, default=0)
 )
 
+Index('ix_rankings_top_rated', rankings_table.c.average_rating.desc(),
+      rankings_table.c.review_count.desc(), rankings_table.c.game_id)
+Index('ix_rankings_most_wishlisted', rankings_table.c.wishlist_count.desc(),
+      rankings_table.c.game_id)
+
+# Full-text search over the games. SQLite creates FTS5 virtual tables from its own DDL, so this table is
+# kept out of metadata and created by create_search_index instead of metadata.create_all.
+search_metadata = MetaData()
+
+games_search_table = Table(
+    'games_fts', search_metadata,
+    Column('rowid', Integer, primary_key=True),  # same as games.game_id
+    Column('title', Text),
+    Column('publisher', Text),
+    Column('description', Text),
+    Column('tags', Text)  # the game's genre names, comma separated
+)
+
+
+def create_search_index(engine):
+    # Creates the search table if it is missing and fills it from the games already in the database.
+    # SQLite builds without FTS5 are left without one, and searches fall back to scanning the games.
+    with engine.begin() as connection:
+        if connection.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'games_fts'")).first() is not None:
+            return
+        try:
+            # The trigram tokenizer makes MATCH a case-insensitive substring search, like the memory repository
+            connection.execute(text("CREATE VIRTUAL TABLE games_fts USING "
+                                    "fts5(title, publisher, description, tags, tokenize = 'trigram')"))
+        except OperationalError:
+            return
+        connection.execute(text(
+            "INSERT INTO games_fts (rowid, title, publisher, description, tags) "
+            "SELECT games.game_id, games.title, games.publisher_name, games.game_description, "
+            "(SELECT group_concat(genres.genre_name, ', ') FROM game_genres "
+            "JOIN genres ON genres.genre_id = game_genres.genre_id WHERE game_genres.game_id = games.game_id) "
+            "FROM games"))
+
+
+def upgrade_schema(engine, games: Iterable[Game] = ()):
+    # Brings a database created by an older version of the app up to the current tables. games is the catalog as
+    # read from the CSV, which fills in the columns the old tables didn't have; it is only read if one is missing.
+    inspector = inspect(engine)
+    tables = inspector.get_table_names()
+    game_columns = [column['name'] for column in inspector.get_columns('games')]
+    genre_indexes = [index['name'] for index in inspector.get_indexes('genres')]
+    publisher_indexes = [index['name'] for index in inspector.get_indexes('publishers')]
+    game_genres_key = inspector.get_pk_constraint('game_genres')['constrained_columns']
+    favourites_key = inspector.get_pk_constraint('user_favourite_games')['constrained_columns']
+    with engine.begin() as connection:
+        if 'recommendations' not in game_columns:
+            _add_recommendations(connection, games)
+        if 'review_count' not in game_columns:
+            _add_rating_totals(connection)
+        if 'ix_genres_genre_name' not in genre_indexes:
+            _merge_duplicate_genres(connection)
+        if 'ix_publishers_name' not in publisher_indexes:
+            _merge_duplicate_publishers(connection)
+        if sorted(game_genres_key) != ['game_id', 'genre_id']:
+            _rebuild_table(connection, game_genres_table)
+        if sorted(favourites_key) != ['game_id', 'user_id']:
+            _rebuild_table(connection, user_favourite_games_table)
+        if 'rankings' not in tables:
+            _create_rankings(connection)
+        for table in metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
+
+
+def rating_counts_sql(game_id='games.game_id'):
+    # SQL for a game's rating_counts text, counted from its reviews
+    count_of = "(SELECT count(*) FROM reviews WHERE reviews.game_id = {} AND reviews.rating = {})"
+    return " || ',' || ".join(count_of.format(game_id, rating) for rating in range(6))
+
+
+def _add_recommendations(connection, games):
+    # Adds the recommendations column and copies each game's figure over from the catalog
+    connection.execute(text("ALTER TABLE games ADD COLUMN recommendations INTEGER"))
+    update = games_table.update().where(games_table.c.game_id == bindparam('stored_game_id')).values(
+        recommendations=bindparam('stored_recommendations'))
+    rows = [{'stored_game_id': game.game_id, 'stored_recommendations': game.recommendations} for game in games]
+    if len(rows) > 0:
+        connection.execute(update, rows)
+
+
+def _add_rating_totals(connection):
+    # Adds the games' rating totals and works them out from the reviews already stored
+    connection.execute(text("ALTER TABLE games ADD COLUMN review_count INTEGER NOT NULL DEFAULT 0"))
+    connection.execute(text("ALTER TABLE games ADD COLUMN rating_sum INTEGER NOT NULL DEFAULT 0"))
+    connection.execute(text("ALTER TABLE games ADD COLUMN rating_counts VARCHAR(64) NOT NULL DEFAULT '0,0,0,0,0,0'"))
+    connection.execute(text(
+        "UPDATE games SET review_count = (SELECT count(*) FROM reviews WHERE reviews.game_id = games.game_id), "
+        "rating_sum = (SELECT coalesce(sum(rating), 0) FROM reviews WHERE reviews.game_id = games.game_id), "
+        f"rating_counts = {rating_counts_sql()} "
+        "WHERE game_id IN (SELECT game_id FROM reviews)"))
+
+
+def _create_rankings(connection):
+    # Builds the leaderboard figures from the reviews and wishlists already stored
+    rankings_table.create(connection)
+    connection.execute(text(
+        "INSERT INTO rankings (game_id, average_rating, review_count, wishlist_count) "
+        "SELECT game_id, CASE WHEN review_count > 0 THEN rating_sum * 1.0 / review_count ELSE 0 END, review_count, "
+        "(SELECT count(*) FROM user_favourite_games WHERE user_favourite_games.game_id = games.game_id) "
+        "FROM games WHERE review_count > 0 OR game_id IN (SELECT game_id FROM user_favourite_games)"))
+
+
+def _merge_duplicate_genres(connection):
+    # Older databases stored a copy of a genre for every game, so point everything at the first copy
+    first_copy = ("(SELECT min(first.genre_id) FROM genres first JOIN genres copy "
+                  "ON first.genre_name = copy.genre_name WHERE copy.genre_id = {})")
+    connection.execute(text("UPDATE game_genres SET genre_id = " + first_copy.format("game_genres.genre_id")))
+    connection.execute(text("UPDATE games SET genres = " + first_copy.format("games.genres") +
+                            " WHERE genres IS NOT NULL"))
+    connection.execute(text("DELETE FROM genres WHERE genre_id NOT IN "
+                            "(SELECT min(genre_id) FROM genres GROUP BY genre_name)"))
+
+
+def _merge_duplicate_publishers(connection):
+    # Games refer to their publisher by name, so keeping the first copy of each name is enough
+    connection.execute(text("DELETE FROM publishers WHERE publisher_id NOT IN "
+                            "(SELECT min(publisher_id) FROM publishers GROUP BY name)"))
+
+
+def _rebuild_table(connection, table):
+    # SQLite can't add a primary key to an existing table, so copy the rows into a new one, dropping duplicates
+    columns = ', '.join(column.name for column in table.columns)
+    connection.execute(text(f"ALTER TABLE {table.name} RENAME TO {table.name}_old"))
+    table.create(connection)
+    connection.execute(text(f"INSERT OR IGNORE INTO {table.name} ({columns}) "
+                            f"SELECT {columns} FROM {table.name}_old"))
+    connection.execute(text(f"DROP TABLE {table.name}_old"))
+
+
+def _keep_slots(cls):
+    # Mapping replaces the domain classes' slot descriptors with SQLAlchemy's, and clear_mappers deletes them.
+    # Put the slots back then, or instances created afterwards would store everything in a __dict__ again.
+    slots = {name: value for name, value in vars(cls).items() if isinstance(value, types.MemberDescriptorType)}
+
+    @event.listens_for(cls, 'class_uninstrument')
+    def restore_slots(class_):
+        if class_ is cls:
+            for name, descriptor in slots.items():
+                if name not in vars(cls):
+                    setattr(cls, name, descriptor)
+
+
+for domain_class in (Publisher, Genre, Game, User, Review):
+    _keep_slots(domain_class)
+
 
 def map_model_to_tables():
     mapper(Publisher, publishers_table, properties={
@@ -77,12 +265,17 @@ def map_model_to_tables():
         '_Game__description': games_table.c.game_description,
         '_Game__image_url': games_table.c.game_image_url,
         '_Game__website_url': games_table.c.game_website_url,
+        '_Game__recommendations': games_table.c.recommendations,
+        '_Game__review_count': games_table.c.review_count,
+        '_Game__rating_sum': games_table.c.rating_sum,
+        '_Game__rating_counts': games_table.c.rating_counts,
         # '_Game__languages': games_table.c.languages,
         '_Game__publisher': relationship(Publisher),
         '_Game__genres': relationship(Genre, secondary=game_genres_table),
         '_Game__reviews': relationship(Review, back_populates='_Review__game'),
         '_Game__favourite_users': relationship(User, secondary=user_favourite_games_table,
-                                               back_populates='_User__favourite_games')
+                                               back_populates='_User__favourite_games',
+                                               collection_class=partial(OrderedSet, key=User.username.fget))
 
     })
 
@@ -95,7 +288,8 @@ def map_model_to_tables():
         '_User__password': users_table.c.password,
         '_User__reviews': relationship(Review, back_populates='_Review__user'),
         '_User__favourite_games': relationship(Game, secondary=user_favourite_games_table,
-                                               back_populates='_Game__favourite_users')
+                                               back_populates='_Game__favourite_users',
+                                               collection_class=partial(OrderedSet, key=Game.game_id.fget))
     })
     mapper(Review, reviews_table, properties={
         '_Review__game': relationship(Game, back_populates='_Game__reviews'),
@@ -0,0 +1,88 @@
+from bisect import bisect_left, insort_left
+from heapq import nlargest
+from typing import Dict, Hashable, Iterable, List, Tuple
+
+from games.adapters.trigram_index import normalize
+
+
+class PrefixIndex:
+    """Autocomplete over titles and publisher names.
+
+    Entries are kept in a sorted array, so the entries starting with a prefix sit next to each other and are
+    found with one bisect. The first keystrokes match too many entries to scan, so the best few entries for every
+    prefix of up to three characters are kept up to date as entries are added. The best matches for longer
+    prefixes are cached, since every keystroke repeats the last one.
+    """
+
+    CACHE_SIZE = 4096
+    SHORT_PREFIX_LENGTH = 3  # prefixes up to this long are answered from the kept best entries
+    SHORT_PREFIX_LIMIT = 10  # number of best entries kept for each short prefix
+
+    def __init__(self):
+        self._entries: List[Tuple[str, str, str, Hashable]] = []  # (normalized text, text, kind, id), sorted
+        self._weights: Dict[Tuple[str, Hashable], int] = dict()  # (kind, id) -> ranking weight
+        self._short: Dict[str, list] = dict()  # short prefix -> (negated weight, entry) of its best entries, sorted
+        self._cache: Dict[Tuple[str, int], list] = dict()  # (normalized prefix, limit) -> suggestions
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, text: str, kind: str, item_id: Hashable, weight: int = 0):
+        # Adding the same (kind, id) again only adds to its weight, e.g. one more game by a publisher
+        entry = self._weigh(text, kind, item_id, weight)
+        if entry is not None:
+            insort_left(self._entries, entry)
+        self._cache.clear()
+
+    def add_all(self, items: Iterable[Tuple[str, str, Hashable, int]]):
+        # Same as calling add with each (text, kind, id, weight), but the new entries are sorted in once
+        new_entries = []
+        for text, kind, item_id, weight in items:
+            entry = self._weigh(text, kind, item_id, weight)
+            if entry is not None:
+                new_entries.append(entry)
+        self._entries.extend(new_entries)
+        self._entries.sort()
+        self._cache.clear()
+
+    def _weigh(self, text: str, kind: str, item_id: Hashable, weight: int):
+        # Adds to the weight of (kind, id) and moves it up its short prefixes; returns the entry if it is new
+        entry = (normalize(text), text, kind, item_id)
+        old_weight = self._weights.get((kind, item_id))
+        new_weight = (old_weight or 0) + weight
+        self._weights[(kind, item_id)] = new_weight
+        # Weights only grow, so an entry can only climb into or within the best entries of its prefixes
+        for prefix in {entry[0][:length] for length in range(1, self.SHORT_PREFIX_LENGTH + 1)}:
+            best = self._short.setdefault(prefix, [])
+            if old_weight is not None:
+                position = bisect_left(best, (-old_weight, entry))
+                if position < len(best) and best[position] == (-old_weight, entry):
+                    del best[position]
+            if len(best) < self.SHORT_PREFIX_LIMIT or (-new_weight, entry) < best[-1]:
+                insort_left(best, (-new_weight, entry))
+                del best[self.SHORT_PREFIX_LIMIT:]
+        return entry if old_weight is None else None
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[Tuple[str, str, Hashable]]:
+        # Up to limit (text, kind, id) entries starting with the prefix, heaviest first and then alphabetical
+        prefix = normalize(prefix)
+        if prefix == "":
+            return []
+        if len(prefix) <= self.SHORT_PREFIX_LENGTH and limit <= self.SHORT_PREFIX_LIMIT:
+            return [(text, kind, item_id) for _, (_, text, kind, item_id) in self._short.get(prefix, [])[:limit]]
+        cache_key = (prefix, limit)
+        if cache_key in self._cache:
+            return self._cache[cache_key]
+
+        matches = []
+        index = bisect_left(self._entries, (prefix,))
+        while index < len(self._entries) and self._entries[index][0].startswith(prefix):
+            matches.append(self._entries[index])
+            index += 1
+        best = nlargest(limit, matches, key=lambda entry: self._weights[(entry[2], entry[3])])
+        suggestions = [(text, kind, item_id) for _, text, kind, item_id in best]
+
+        if len(self._cache) >= self.CACHE_SIZE:
+            self._cache.clear()
+        self._cache[cache_key] = suggestions
+        return suggestions
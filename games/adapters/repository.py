@@ -1,11 +1,46 @@
 import abc
-from typing import List
+from bisect import bisect_left, bisect_right
+from typing import Iterable, List
 
-from games.domainmodel.model import Game, User, Review
+from games.domainmodel.model import Game, User, Review, Genre
 
 repo_instance = None
 
 
+def title_key(game: Game):
+    # Sort key of the title-ordered views; game_id breaks ties between games with the same title
+    return game.title or "", game.game_id
+
+
+def range_after(items, key=None, limit: int = None, inclusive: bool = False, sort_key=None):
+    # (start, stop) slice of a sorted list holding up to limit items after key (or from it, when inclusive). The
+    # items are compared by sort_key(item) when it is given, so a list of games needs no parallel list of keys.
+    if key is None:
+        start = 0
+    elif inclusive:
+        start = bisect_left(items, key, key=sort_key)
+    else:
+        start = bisect_right(items, key, key=sort_key)
+    stop = len(items) if limit is None else min(start + limit, len(items))
+    return start, stop
+
+
+def range_before(items, key=None, limit: int = None, sort_key=None):
+    # (start, stop) slice of a sorted list holding up to limit items before key, or the last ones if key is None
+    stop = len(items) if key is None else bisect_left(items, key, key=sort_key)
+    start = 0 if limit is None else max(stop - limit, 0)
+    return start, stop
+
+
+# Orders a game's reviews can be listed in, best first. A review's place in them is its review key, where
+# number counts up as reviews are added (the review_id in the database), so larger keys come first.
+REVIEW_ORDERS = ('newest', 'highest')
+
+
+def review_key(order: str, rating: int, number: int):
+    return (rating, number) if order == 'highest' else (number,)
+
+
 class RepositoryException(Exception):
     def __init__(self, message=None):
         print(f"RepositoryException: {message}")
@@ -18,6 +53,11 @@ class AbstractRepository(abc.ABC):
 
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def add_games(self, games: Iterable[Game], progress=None, batch_size: int = 1000):
+        # Adds many games at once, calling progress(number of games added so far) after every batch
+        raise NotImplementedError
+
     @abc.abstractmethod
     def get_games(self) -> List[Game]:
 
@@ -36,10 +76,92 @@ class AbstractRepository(abc.ABC):
     def get_last_game(self):
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def get_first_game_by_title(self, genre_name: str = None):
+        # First game in title order, optionally only among the games of a genre; None if there are none
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_last_game_by_title(self, genre_name: str = None):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_games_sorted_by_title(self, start: int = 0, limit: int = None) -> List[Game]:
+        # Games ordered by (title, game_id), sliced from position start
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_title_rank(self, game_id: int):
+        # Position of the game in get_games_sorted_by_title, or None if there is no such game
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_games_after(self, key=None, limit: int = 5, inclusive: bool = False) -> List[Game]:
+        # Up to limit games following the (title, game_id) key in title order; key None starts at the first game
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_games_before(self, key=None, limit: int = 5) -> List[Game]:
+        # Up to limit games preceding the (title, game_id) key, still in title order; key None ends at the last game
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_games_by_genre(self, genre_name: str, key=None, limit: int = 5, inclusive: bool = False) -> List[Game]:
+        # Same as get_games_after, restricted to games with the genre
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_games_by_genre_before(self, genre_name: str, key=None, limit: int = 5) -> List[Game]:
+        # Same as get_games_before, restricted to games with the genre
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def count_games_by_genre(self, genre_name: str) -> int:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_games_in_price_range(self, lower_price, upper_price=None, limit: int = None) -> List[Game]:
+        # Games with lower_price < price <= upper_price (no upper bound if None), ordered by price then title
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def search_games(self, search_query: str, search_criteria: str, genre: str = None, key=None, limit: int = None,
+                     inclusive: bool = False) -> List[Game]:
+        # Games whose title and/or publisher name contains the query, ignoring case, in title order.
+        # search_criteria is 'title', 'publisher' or anything else for both; genre 'all' or None means any genre.
+        # key, limit and inclusive seek through the results the same way as get_games_after
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def search_games_before(self, search_query: str, search_criteria: str, genre: str = None, key=None,
+                            limit: int = 5) -> List[Game]:
+        # Same as get_games_before, over the results of search_games
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def count_search_games(self, search_query: str, search_criteria: str, genre: str = None) -> int:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_search_suggestions(self, prefix: str, limit: int = 10):
+        # Up to limit (text, kind, id) titles and publishers starting with the prefix, ignoring case, ranked by
+        # recommendations. kind is 'title' with the game_id as id, or 'publisher' with the publisher name as id
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_unique_genres(self) -> List[Genre]:
+        # Every distinct genre in the catalog, sorted by name
+        raise NotImplementedError
+
     @abc.abstractmethod
     def get_game_id(self, game_id: int):
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def get_game_details(self, game_id: int):
+        # Same game as get_game_id, with its publisher and genres loaded for the description page
+        raise NotImplementedError
+
     @abc.abstractmethod
     def add_user(self, user: User):
         raise NotImplementedError
@@ -48,6 +170,9 @@ class AbstractRepository(abc.ABC):
     def get_user(self, user: User):
         raise NotImplementedError
 
+    def get_users(self, usernames) -> List[User]:
+        raise NotImplementedError
+
     @abc.abstractmethod
     def change_password(self, user: User, password: str):
         raise NotImplementedError
@@ -62,4 +187,26 @@ class AbstractRepository(abc.ABC):
     def add_review(self, review: Review):
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def get_reviews_for_game(self, game_id: int, cursor=None, limit: int = 10, order: str = 'newest'):
+        # (reviews, next cursor): up to limit of the game's reviews that come after the review key cursor in the
+        # order, and the key to continue from, which is None on the last page
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_top_rated_games(self, limit: int = 50):
+        # (game, average rating) for the best rated games with reviews, best first. Ties go to the game with more
+        # reviews, then to the smaller game_id.
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_most_wishlisted_games(self, limit: int = 50):
+        # (game, number of wishlists it is on) for the most wished for games, most first, then by game_id
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def has_review(self, game_id: int, username: str) -> bool:
+        # Whether the user has already reviewed the game
+        raise NotImplementedError
+
 
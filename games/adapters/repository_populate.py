@@ -2,16 +2,25 @@ from pathlib import Path
 import os
 from games.adapters.repository import AbstractRepository
 from games.adapters.datareader.csvdatareader import GameFileCSVReader, UserFileCSVReader
+from games.adapters.datareader.parallelreader import ParallelGameFileCSVReader
+from games.adapters.datareader.snapshot import GameSnapshotFile
 
+# CSV files at least this big are parsed by a pool of processes, when there is more than one core
+PARALLEL_CSV_BYTES = 64 * 1024 * 1024
 
-def add_games(repo: AbstractRepository):
+
+def read_games():
+    # Games of the catalog in games.csv, streamed as they are read
     dir_name = os.path.dirname(os.path.abspath(__file__))
     file_name = os.path.join(dir_name, "data/games.csv")  # Get the repository and set that as the filename of the csv file we want to read
-    reader = GameFileCSVReader(file_name)
-    reader.read_csv_file()
-    games = reader.dataset_of_games  # Generate all the games into a dataset
-    for game in games:
-        repo.add_game(game)  # Add each game to the repo from the csv file
+    reader_class = GameFileCSVReader
+    if os.path.exists(file_name) and os.path.getsize(file_name) >= PARALLEL_CSV_BYTES and (os.cpu_count() or 1) > 1:
+        reader_class = ParallelGameFileCSVReader
+    return GameSnapshotFile(file_name, reader_class=reader_class).iter_games()  # Read from the compiled snapshot unless the csv has changed
+
+
+def add_games(repo: AbstractRepository, progress=None):
+    repo.add_games(read_games(), progress)  # Games are streamed into the repo in bulk as they are read
 
 
 def load_users(repo: AbstractRepository):
@@ -24,6 +33,6 @@ def load_users(repo: AbstractRepository):
         repo.add_user(user)
 
 
-def populate(repo: AbstractRepository):
-    add_games(repo)
+def populate(repo: AbstractRepository, progress=None):
+    add_games(repo, progress)
     load_users(repo)
\ No newline at end of file
@@ -0,0 +1,49 @@
+from typing import Dict, Hashable, Set
+
+
+def normalize(text: str) -> str:
+    # Searches are case-insensitive, the same as comparing lower() strings
+    return text.lower()
+
+
+def trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TrigramIndex:
+    """Substring search over short strings such as titles and publisher names.
+
+    Every trigram of a string points at the documents containing it, so a query only has to check the
+    documents that share all of its trigrams instead of every string in the index.
+    """
+
+    def __init__(self):
+        self._texts: Dict[Hashable, str] = dict()  # document id -> normalized text
+        self._postings: Dict[str, Set[Hashable]] = dict()  # trigram -> ids of documents containing it
+
+    def __len__(self):
+        return len(self._texts)
+
+    def add(self, doc_id: Hashable, text: str):
+        text = normalize(text)
+        self._texts[doc_id] = text
+        for gram in trigrams(text):
+            self._postings.setdefault(gram, set()).add(doc_id)
+
+    def search(self, query: str) -> Set[Hashable]:
+        query = normalize(query)
+        grams = trigrams(query)
+        if len(grams) == 0:
+            # Queries shorter than a trigram can't use the postings, so check every text
+            return {doc_id for doc_id, text in self._texts.items() if query in text}
+
+        # Intersect from the shortest posting list so the candidate set shrinks as fast as possible
+        postings = sorted((self._postings.get(gram, set()) for gram in grams), key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            if len(candidates) == 0:
+                break
+            candidates &= posting
+
+        # Sharing every trigram doesn't mean the trigrams are adjacent, so verify each candidate
+        return {doc_id for doc_id in candidates if query in self._texts[doc_id]}
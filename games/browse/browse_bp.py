@@ -1,4 +1,4 @@
-from flask import Flask, render_template, Blueprint, request, url_for, redirect
+from flask import Flask, render_template, Blueprint, request, url_for, redirect, jsonify
 import games.adapters.repository as repo
 from games.browse import services
 from games.home.services import get_unique_genres
@@ -17,43 +17,57 @@ browse_blueprint = Blueprint('games_bp', __name__)
 #                             # Room for templates such as title, heading, etc.
 
 
-@browse_blueprint.route('/games', methods=['GET'])
-def games():
-    # I will enable this later
-    # number_of_games_in_page = request.args.get('num_games')
-    number_of_games_in_page = 5
-    target_id = request.args.get('id')
-    num_games = services.get_number_of_games(repo.repo_instance)
-    # If there is no games to show, redirect to home page
-    if num_games <= 0:
-        return redirect(url_for('home_bp.home'))
-    first_game = services.get_first_game(repo.repo_instance)
-    last_game = services.get_last_game(repo.repo_instance)
-    if target_id is None:
-        target_id = first_game.game_id
-    else:
-        # Convert query string to int type for processing
-        target_id = int(target_id)
-        print(target_id)
-    games_to_show, previous_id, next_id = services.get_games_by_id(target_id, number_of_games_in_page, repo.repo_instance, "all")
-
-    # if games_to_show is empty, it means query value is wrong, so set target id to id of first game
-    if len(games_to_show) <= 0:
-        target_id = first_game.game_id
-        games_to_show, previous_id, next_id = services.get_games_by_id(target_id, number_of_games_in_page,
-                                                                       repo.repo_instance)
+DEFAULT_PAGE_SIZE = 5
+MAX_PAGE_SIZE = 50
+DEFAULT_SUGGESTIONS = 8
+MAX_SUGGESTIONS = 20
+
+
+def get_page_size():
+    # Optional ?page_size= query parameter, clamped so a request can't ask for the whole catalog
+    page_size = request.args.get('page_size', DEFAULT_PAGE_SIZE, type=int)
+    return min(max(page_size, 1), MAX_PAGE_SIZE)
 
+
+def get_cursor():
+    cursor = request.args.get('cursor')
+    target_id = request.args.get('id')
+    if cursor is None and target_id is not None:
+        # Old ?id=<game_id> links start the page on that game
+        try:
+            cursor = services.cursor_for_game_id(int(target_id), repo.repo_instance)
+        except ValueError:
+            cursor = None
+    return cursor
+
+
+def get_page_urls(endpoint, previous_cursor, next_cursor, **values):
+    # Only carry page_size through the links when the user asked for one
+    if 'page_size' in request.args:
+        values['page_size'] = get_page_size()
     first_page_url = None
     previous_page_url = None
     next_page_url = None
     last_page_url = None
+    if previous_cursor is not None:
+        first_page_url = url_for(endpoint, **values)
+        previous_page_url = url_for(endpoint, cursor=previous_cursor, **values)
+    if next_cursor is not None:
+        next_page_url = url_for(endpoint, cursor=next_cursor, **values)
+        last_page_url = url_for(endpoint, cursor=services.encode_cursor('prev'), **values)
+    return first_page_url, previous_page_url, next_page_url, last_page_url
+
 
-    if previous_id is not None:
-        first_page_url = url_for('games_bp.games', id=first_game.game_id)
-        previous_page_url = url_for('games_bp.games', id=previous_id)
-    if next_id is not None:
-        next_page_url = url_for('games_bp.games', id=next_id)
-        last_page_url = url_for('games_bp.games', id=last_game.game_id)
+@browse_blueprint.route('/games', methods=['GET'])
+def games():
+    num_games = services.get_number_of_games(repo.repo_instance)
+    # If there is no games to show, redirect to home page
+    if num_games <= 0:
+        return redirect(url_for('home_bp.home'))
+    games_to_show, previous_cursor, next_cursor = services.get_games_page(get_cursor(), get_page_size(),
+                                                                          repo.repo_instance)
+    first_page_url, previous_page_url, next_page_url, last_page_url = get_page_urls(
+        'games_bp.games', previous_cursor, next_cursor)
 
     return render_template(
         'games/games_by_id.html',
@@ -61,45 +75,21 @@ def games():
         games=games_to_show,
         previous_page_url=previous_page_url,
         next_page_url=next_page_url,
-        previous_id=previous_id,
-        next_id=next_id,
         first_page_url=first_page_url,
-        first_id=first_game.game_id,
         last_page_url=last_page_url,
-        last_id=last_game.game_id,
         unique_genres=get_unique_genres(repo.repo_instance)
     )
 
 
 @browse_blueprint.route('/genre/<genre_name>')
 def genre_games(genre_name):
-    number_of_games_in_page = 5
-    target_id = request.args.get('id')
-
     num_games = services.get_number_of_genre_games(repo.repo_instance, genre_name)
-    first_game = services.get_first_genre_game(repo.repo_instance, genre_name)
-    last_game = services.get_last_genre_game(repo.repo_instance, genre_name)
-
-    if target_id is None:
-        target_id = first_game.game_id
-    else:
-        target_id = int(target_id)
-
-    # Retrieve games associated with the selected genre and ID
-    games_to_show, previous_id, next_id = services.get_games_by_id(
-        target_id, number_of_games_in_page, repo.repo_instance, genre_name
-    )
-    first_page_url = None
-    previous_page_url = None
-    next_page_url = None
-    last_page_url = None
 
-    if previous_id is not None:
-        first_page_url = url_for('games_bp.genre_games', genre_name=genre_name, id=first_game.game_id)
-        previous_page_url = url_for('games_bp.genre_games', genre_name=genre_name, id=previous_id)
-    if next_id is not None:
-        next_page_url = url_for('games_bp.genre_games', genre_name=genre_name, id=next_id)
-        last_page_url = url_for('games_bp.genre_games', genre_name=genre_name, id=last_game.game_id)
+    # Retrieve games associated with the selected genre
+    games_to_show, previous_cursor, next_cursor = services.get_games_page(get_cursor(), get_page_size(),
+                                                                          repo.repo_instance, genre_name)
+    first_page_url, previous_page_url, next_page_url, last_page_url = get_page_urls(
+        'games_bp.genre_games', previous_cursor, next_cursor, genre_name=genre_name)
 
     return render_template(
         'games/games_by_genre.html',
@@ -108,12 +98,8 @@ def genre_games(genre_name):
         games=games_to_show,
         previous_page_url=previous_page_url,
         next_page_url=next_page_url,
-        previous_id=previous_id,
-        next_id=next_id,
         first_page_url=first_page_url,
-        first_id=first_game.game_id,
         last_page_url=last_page_url,
-        last_id=last_game.game_id,
         unique_genres=get_unique_genres(repo.repo_instance)
     )
 
@@ -127,68 +113,12 @@ def search_games():
     if not search_query or not search_criteria:  # Check if user entered anything
         return redirect(url_for('games_bp.games'))
 
-    number_of_games_in_page = 5
-    filtered_games = services.get_games_with_search(repo.repo_instance, search_query, search_criteria, search_genre)
-    num_games = len(filtered_games)
-
-    if not filtered_games:
-        return render_template(
-            'games/games_search.html',
-            query=search_query,
-            criteria=search_criteria,
-            genre=search_genre,
-            games=[],
-            previous_page_url=None,
-            next_page_url=None,
-            first_page_url=None,
-            last_page_url=None,
-            first_id=None,
-            previous_id=None,
-            next_id=None,
-            last_id=None,
-            num_games=0,
-            unique_genres=get_unique_genres(repo.repo_instance)
-        )
-
-    target_id = request.args.get('id')
-    if filtered_games:
-        first_game = filtered_games[0]
-        first_id = first_game.game_id
-        last_game = filtered_games[-1]
-        last_id = last_game.game_id
-    else:
-        first_game, last_game = None, None
-
-    if target_id is None:
-        if first_game is None:
-            filtered_games = []  # No games to show
-            first_game = None
-            first_id = None
-            last_game = None
-            last_id = None
-        else:
-            target_id = first_game.game_id
-    else:
-        target_id = int(target_id)
-
-    games_to_show, previous_id, next_id = services.get_games_by_id(
-        target_id, number_of_games_in_page, repo.repo_instance, "all", filtered_games)
-
-    first_page_url = None
-    previous_page_url = None
-    next_page_url = None
-    last_page_url = None
-
-    if previous_id is not None:
-        first_page_url = url_for('games_bp.search_games', id=first_game.game_id,
-                                 query=search_query, criteria=search_criteria)
-        previous_page_url = url_for('games_bp.search_games', id=previous_id,
-                                    query=search_query, criteria=search_criteria)
-    if next_id is not None:
-        next_page_url = url_for('games_bp.search_games', id=next_id,
-                                query=search_query, criteria=search_criteria)
-        last_page_url = url_for('games_bp.search_games', id=last_game.game_id,
-                                query=search_query, criteria=search_criteria)
+    num_games = services.get_number_of_search_games(repo.repo_instance, search_query, search_criteria, search_genre)
+    games_to_show, previous_cursor, next_cursor = services.get_games_page(
+        get_cursor(), get_page_size(), repo.repo_instance, search=(search_query, search_criteria, search_genre))
+    first_page_url, previous_page_url, next_page_url, last_page_url = get_page_urls(
+        'games_bp.search_games', previous_cursor, next_cursor,
+        query=search_query, criteria=search_criteria, genre=search_genre)
 
     return render_template(
         'games/games_search.html',
@@ -200,11 +130,14 @@ def search_games():
         next_page_url=next_page_url,
         first_page_url=first_page_url,
         last_page_url=last_page_url,
-        first_id=first_id,
-        previous_id=previous_id,
-        next_id=next_id,
-        last_id=last_id,
         num_games=num_games,
         unique_genres=get_unique_genres(repo.repo_instance)
     )
 
+
+@browse_blueprint.route('/search/suggest', methods=['GET'])
+def search_suggestions():
+    # JSON suggestions for the search bar, e.g. /search/suggest?q=cal&limit=5
+    prefix = request.args.get('q', '')
+    limit = min(max(request.args.get('limit', DEFAULT_SUGGESTIONS, type=int), 1), MAX_SUGGESTIONS)
+    return jsonify(services.get_search_suggestions(repo.repo_instance, prefix, limit))
@@ -1,5 +1,10 @@
+import base64
+import binascii
+import json
+from functools import partial
+
 from flask import url_for
-from games.adapters.repository import AbstractRepository
+from games.adapters.repository import AbstractRepository, title_key, range_after, range_before
 from games.domainmodel.model import Game  # I dont think this is necessary but I will keep it incase it causes an error.
 
 
@@ -21,94 +26,185 @@ def get_games(repo: AbstractRepository):
 
 
 def get_first_game(repo: AbstractRepository):
-    games = repo.get_games()
-    return sorted(games, key=lambda x: x.title)[0]
+    return repo.get_first_game_by_title()
 
 
 def get_last_game(repo: AbstractRepository):
-    games = repo.get_games()
-    return sorted(games, key=lambda x: x.title)[-1]
+    return repo.get_last_game_by_title()
 
 
 def get_games_by_id(id: int, number_of_games_in_page: int, repo: AbstractRepository, genre_name, filtered_games=None):
-    if filtered_games:  # Check if using default game library or filtered games (for search games)
-        games = filtered_games
-    else:
-        games = repo.get_games()
+    if filtered_games or genre_name != "all":
+        if filtered_games:  # Check if using default game library or filtered games (for search games, already in title order)
+            games = filtered_games
+            if genre_name != "all":
+                games = [game for game in games if any(genre.genre_name == genre_name for genre in game.genres)]
+        else:
+            games = get_games_for_genre(repo, genre_name)
+        index = next((i for i in range(len(games)) if games[i].game_id == id), None)
+        return _page_of_games(index, number_of_games_in_page, len(games),
+                              lambda start, limit: games[start:start + limit])
 
-    if genre_name != "all":  # Check if using default game library or games based on a specific genre
-        games = [game for game in games if any(genre.genre_name == genre_name for genre in game.genres)]
+    # Whole catalog: find the page straight from the repository's title-ordered view
+    return _page_of_games(repo.get_title_rank(id), number_of_games_in_page, repo.get_number_of_games(),
+                          repo.get_games_sorted_by_title)
 
-    games = sorted(games, key=lambda x: x.title)
 
-    games_to_show = []
-    index = 0
+def _page_of_games(index, number_of_games_in_page: int, number_of_games: int, games_from):
+    # games_from(start, limit) returns the title-ordered games from position start
     previous_id = None
     next_id = None
-    if len(games) > 0:
-        # Find index using id of certain game
-        for i in range(len(games)):
-            if games[i].game_id == id:
-                if i == 0:
-                    pass
-                elif i > number_of_games_in_page:
-                    previous_id = games[i - number_of_games_in_page].game_id
-                else:
-                    previous_id = games[0].game_id
-                index = i
-                if i < len(games) - number_of_games_in_page:
-                    next_id = games[i + number_of_games_in_page].game_id
-                break
-        # Insert games in games_to_show until index is valid
-        print(index)
-        for i in range(index, index + number_of_games_in_page):
-            if i < len(games):
-                game = games[i]
-                games_to_show.append({'game_id': game.game_id, 'title': game.title, 'game_url': game.release_date,
-                                      'game_img': game.image_url})
+    if index is None:
+        # Unknown id, so show the first page without any navigation
+        index = 0
+    else:
+        if index > 0:
+            previous_id = games_from(max(index - number_of_games_in_page, 0), 1)[0].game_id
+        if index < number_of_games - number_of_games_in_page:
+            next_id = games_from(index + number_of_games_in_page, 1)[0].game_id
+    games_to_show = []
+    for game in games_from(index, number_of_games_in_page):
+        games_to_show.append({'game_id': game.game_id, 'title': game.title, 'game_url': game.release_date,
+                              'game_img': game.image_url})
     return games_to_show, previous_id, next_id
 
 
+# ===================================================
+# Keyset (cursor) pagination
+# ===================================================
+
+# A cursor names a position in title order and which way to page from it:
+# "next" pages after the game, "prev" pages before it and "at" starts the page on it.
+CURSOR_DIRECTIONS = ('next', 'prev', 'at')
+
+
+def encode_cursor(direction: str, game: Game = None):
+    # A cursor without a game pages from the end of the list in that direction
+    key = None if game is None else list(title_key(game))
+    raw = json.dumps([direction, key]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor):
+    # Missing or malformed cursors are treated as no cursor, i.e. the first page
+    if not cursor:
+        return None, None
+    try:
+        direction, key = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        if direction not in CURSOR_DIRECTIONS:
+            return None, None
+        if key is None:
+            return direction, None
+        title, game_id = key
+        if not isinstance(title, str) or type(game_id) is not int:
+            return None, None
+        return direction, (title, game_id)
+    except (ValueError, TypeError, binascii.Error):
+        return None, None
+
+
+def cursor_for_game_id(game_id: int, repo: AbstractRepository):
+    # Supports the old ?id= links by starting the page on that game
+    game = repo.get_game_id(game_id)
+    if game is None:
+        return None
+    return encode_cursor('at', game)
+
+
+def _seek_in_list(games):
+    # Same seek operations as the repository, over an already title-ordered list
+    def games_after(key=None, limit=5, inclusive=False):
+        start, stop = range_after(games, key, limit, inclusive, sort_key=title_key)
+        return games[start:stop]
+
+    def games_before(key=None, limit=5):
+        start, stop = range_before(games, key, limit, sort_key=title_key)
+        return games[start:stop]
+
+    return games_after, games_before
+
+
+def get_games_page(cursor, page_size: int, repo: AbstractRepository, genre_name="all", filtered_games=None,
+                   search=None):
+    # search is a (query, criteria, genre) tuple to page through search results instead
+    if search is not None:
+        games_after = partial(repo.search_games, *search)
+        games_before = partial(repo.search_games_before, *search)
+    elif filtered_games is not None:
+        games = filtered_games
+        if genre_name != "all":
+            games = [game for game in games if any(genre.genre_name == genre_name for genre in game.genres)]
+        games_after, games_before = _seek_in_list(games)
+    elif genre_name != "all":
+        # Genre pages seek straight into the repository's genre index
+        games_after = partial(repo.get_games_by_genre, genre_name)
+        games_before = partial(repo.get_games_by_genre_before, genre_name)
+    else:
+        games_after, games_before = repo.get_games_after, repo.get_games_before
+
+    direction, key = decode_cursor(cursor)
+    if direction == 'prev':
+        page = games_before(key, page_size)
+        if len(page) < page_size:
+            # Paging back past the start lands on a full first page
+            page = games_after(None, page_size)
+    elif direction == 'at':
+        page = games_after(key, page_size, inclusive=True)
+    elif direction == 'next':
+        page = games_after(key, page_size)
+    else:
+        page = games_after(None, page_size)
+
+    if len(page) == 0 and direction is not None:
+        # Stale cursor past the end of the list, so fall back to the first page
+        page = games_after(None, page_size)
+
+    previous_cursor = None
+    next_cursor = None
+    if len(page) > 0:
+        if len(games_before(title_key(page[0]), 1)) > 0:
+            previous_cursor = encode_cursor('prev', page[0])
+        if len(games_after(title_key(page[-1]), 1)) > 0:
+            next_cursor = encode_cursor('next', page[-1])
+
+    games_to_show = [{'game_id': game.game_id, 'title': game.title, 'game_url': game.release_date,
+                      'game_img': game.image_url} for game in page]
+    return games_to_show, previous_cursor, next_cursor
+
+
 def get_games_for_genre(repo: AbstractRepository, genre_name):
-    games = repo.get_games()
-    games = sorted(games, key=lambda x: x.title)
-    return [game for game in games if any(genre.genre_name == genre_name for genre in game.genres)]
+    return repo.get_games_by_genre(genre_name, limit=repo.count_games_by_genre(genre_name))
 
 
 def get_number_of_genre_games(repo: AbstractRepository, genre_name):
-    games_for_genre = get_games_for_genre(repo, genre_name)
-    return len(games_for_genre)
+    return repo.count_games_by_genre(genre_name)
 
 
 def get_first_genre_game(repo: AbstractRepository, genre_name):
-    games_for_genre = get_games_for_genre(repo, genre_name)
-    if games_for_genre:
-        return games_for_genre[0]
-    return None
+    return repo.get_first_game_by_title(genre_name)
 
 
 def get_last_genre_game(repo: AbstractRepository, genre_name):
-    games_for_genre = get_games_for_genre(repo, genre_name)
-    if games_for_genre:
-        return games_for_genre[-1]
-    return None
+    return repo.get_last_game_by_title(genre_name)
 
 
 def get_games_with_search(repo: AbstractRepository, search_query, search_criteria, genre=None, language=None):
-    games = repo.get_games()
+    if not search_query or not search_criteria:  # Check if user entered anything
+        return []
+    return repo.search_games(search_query, search_criteria, genre)
 
-    if search_query and search_criteria:  # Check if user entered anything
-        if search_criteria == 'title':
-            filtered_games = [game for game in games if search_query.lower() in game.title.lower()]
-        elif search_criteria == 'publisher':
-            filtered_games = [game for game in games if search_query.lower() in game.publisher.publisher_name.lower()]
-        else:
-            filtered_games = [game for game in games if search_query.lower() in game.title.lower() or
-                              search_query.lower() in game.publisher.publisher_name.lower()]
-    else:
-        filtered_games = []
 
-    if genre and genre != "all":  # Check if user selected a specific genre
-        filtered_games = [game for game in filtered_games if any(g.genre_name == genre for g in game.genres)]
+def get_number_of_search_games(repo: AbstractRepository, search_query, search_criteria, genre=None):
+    if not search_query or not search_criteria:
+        return 0
+    return repo.count_search_games(search_query, search_criteria, genre)
+
 
-    return sorted(filtered_games, key=lambda x: x.title)
+def get_search_suggestions(repo: AbstractRepository, prefix, limit: int = 10):
+    suggestions = []
+    for text, kind, item_id in repo.get_search_suggestions(prefix, limit):
+        suggestion = {'text': text, 'type': kind}
+        if kind == 'title':
+            suggestion['game_id'] = item_id
+        suggestions.append(suggestion)
+    return suggestions
@@ -1,4 +1,4 @@
-from flask import Blueprint, render_template, session, redirect, url_for, request
+from flask import Blueprint, render_template, session, redirect, url_for, request, jsonify
 from games.description import services
 import games.adapters.repository as repo
 from games.home.services import get_unique_genres
@@ -17,27 +17,39 @@ def description(game_id):
     if 'username' in session:
         username = session['username']
         user = get_user_for_wishlist(username, repo.repo_instance)
-        fav = repo.repo_instance.get_wishlist(username)
-        print(fav)
-        game_in_wishlist = any(game.game_id == game_id for game in fav)
-        print(game_id)
-        print(game_in_wishlist)
+        game_in_wishlist = user.has_favourite(game_id)
         can_review = services.validity_of_review(game_id, username, repo.repo_instance)
     else:
         user = None
         game_in_wishlist = None
         can_review = True
     average_rating = services.average_rating(game_id, repo.repo_instance)
+    # Only the first page of reviews; the page fetches the rest from game_reviews when asked
+    review_order = request.args.get('order', 'newest')
+    if review_order not in repo.REVIEW_ORDERS:
+        review_order = 'newest'
+    reviews, next_reviews = services.get_reviews_page(game_id, repo.repo_instance, order=review_order)
     return render_template('gameDescription/gameDescription.html',
                            game=game,
                            unique_genres=get_unique_genres(repo.repo_instance),
                            can_review=can_review,
                            user=user,
                            game_in_wishlist=game_in_wishlist,
-                           average_rating = average_rating
+                           average_rating = average_rating,
+                           reviews=reviews,
+                           review_order=review_order,
+                           next_reviews=next_reviews
                            )
 
 
+@description_blueprint.route('/description/<int:game_id>/reviews', methods=['GET'])
+def game_reviews(game_id):
+    # JSON page of reviews, e.g. /description/7940/reviews?order=highest&cursor=...
+    reviews, next_reviews = services.get_reviews_page(game_id, repo.repo_instance, request.args.get('cursor'),
+                                                      request.args.get('order', 'newest'))
+    return jsonify({'reviews': reviews, 'next': next_reviews})
+
+
 @description_blueprint.route('/review/<int:game_id>', methods=['GET', 'POST'])
 @login_required
 def review_game(game_id):
@@ -49,8 +61,6 @@ def review_game(game_id):
         game_id = int(form.game_id.data)
         services.add_review(game_id, form.review.data, form.rating.data, username, repo.repo_instance)
 
-        game = services.get_game_id(game_id, repo.repo_instance)
-        print(game['reviews'])
         return redirect(url_for('description_bp.description', game_id=game_id))
 
     if request.method == 'GET':
@@ -1,4 +1,7 @@
-from games.adapters.repository import AbstractRepository
+from games.adapters.repository import AbstractRepository, REVIEW_ORDERS
+import base64
+import binascii
+import json
 import re
 from games.domainmodel.model import Game, Review
 from typing import Iterable
@@ -9,8 +12,11 @@ class NonExistentGameException(Exception):
     pass
 
 
+REVIEWS_PER_PAGE = 10
+
+
 def get_game_id(game_id, repo: AbstractRepository): # Gets the game from the repo via the game_id
-    game = repo.get_game_id(game_id)
+    game = repo.get_game_details(game_id)
     if game is not None:
         return {'game_id': game.game_id,
                 'title': game.title,
@@ -20,7 +26,7 @@ def get_game_id(game_id, repo: AbstractRepository): # Gets the game from the rep
                 'description': game.description,
                 'publisher': game.publisher,
                 'genres': ', '.join(genre.genre_name for genre in game.genres),
-                'reviews': game.reviews}
+                'review_count': game.review_count}
     return None
 
 
@@ -59,25 +65,44 @@ def reviews_to_dict(reviews: Iterable[Review]):
     return [review_to_dict(review) for review in reviews]
 
 
+def encode_review_cursor(key):
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode('utf-8')).decode('ascii')
+
+
+def decode_review_cursor(cursor, order: str):
+    # Missing, malformed or other-order cursors are treated as no cursor, i.e. the first page
+    if not cursor:
+        return None
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, TypeError, binascii.Error):
+        return None
+    if not isinstance(key, list) or len(key) != (2 if order == 'highest' else 1) or \
+            any(type(value) is not int for value in key):
+        return None
+    return tuple(key)
+
+
+def get_reviews_page(game_id, repo: AbstractRepository, cursor=None, order='newest', page_size=REVIEWS_PER_PAGE):
+    # (reviews, cursor of the next page or None) for the description page
+    if order not in REVIEW_ORDERS:
+        order = 'newest'
+    reviews, next_key = repo.get_reviews_for_game(game_id, decode_review_cursor(cursor, order), page_size, order)
+    page = [{'username': review.user.username, 'comment': review.comment, 'rating': review.rating}
+            for review in reviews]
+    return page, None if next_key is None else encode_review_cursor(next_key)
+
+
 def validity_of_review(game_id, username, repo: AbstractRepository):
     game = repo.get_game_id(game_id)
     if game is None:
         raise ValueError("Game not found for the provided game_id")
-    for review in game.reviews:
-        if username == review.user.username:
-            return False
-    return True
+    return not repo.has_review(game_id, username)
 
 def average_rating(game_id, repo):
-
+    # Read from the game's running totals rather than its reviews
     game = repo.get_game_id(game_id)
-    review_list = game.reviews
-    total = len(review_list)
-    rating_sum = 0
-    if total == 0:
+    if game.average_rating is None:
         return "No reviews"
-    for review in review_list:
-        rating = review.rating
-        rating_sum += rating
-    return round(rating_sum / total, 1)
+    return round(game.average_rating, 1)
 
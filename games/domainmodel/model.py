@@ -1,7 +1,81 @@
 from datetime import datetime
 
 
+class OrderedSet:
+    """Collection of distinct items in the order they were added, used for the favourites and wishlists.
+
+    Items are stored as the values of a dict keyed by key(item) (the item itself by default), so membership,
+    appending and removal take constant time while iterating, indexing and comparing with a list still work like
+    the list it replaces. It has a list's append and remove, which lets SQLAlchemy use it as a collection_class.
+    """
+
+    def __init__(self, items=(), key=None):
+        self.__key = key
+        self.__items = dict()
+        for item in items:
+            self.append(item)
+
+    def __key_of(self, item):
+        return item if self.__key is None else self.__key(item)
+
+    def append(self, item):
+        # Appending an item that is already there keeps it in its place
+        self.__items.setdefault(self.__key_of(item), item)
+
+    def extend(self, items):
+        for item in items:
+            self.append(item)
+
+    def remove(self, item):
+        try:
+            del self.__items[self.__key_of(item)]
+        except (KeyError, AttributeError, TypeError):
+            raise ValueError(f"{item!r} is not in the collection")
+
+    def clear(self):
+        self.__items.clear()
+
+    def contains_key(self, key) -> bool:
+        return key in self.__items
+
+    def __contains__(self, item):
+        try:
+            return self.__key_of(item) in self.__items
+        except (AttributeError, TypeError):
+            return False
+
+    def __iter__(self):
+        return iter(self.__items.values())
+
+    def __reversed__(self):
+        return reversed(self.__items.values())
+
+    def __len__(self):
+        return len(self.__items)
+
+    def __getitem__(self, index):
+        return list(self.__items.values())[index]
+
+    def __setitem__(self, index, item):
+        # Replaces the item at a position, e.g. with the stored copy of an equal item
+        items = list(self.__items.values())
+        items[index] = item
+        self.__items = {self.__key_of(value): value for value in items}
+
+    def __eq__(self, other):
+        if not isinstance(other, (list, OrderedSet)):
+            return NotImplemented
+        return list(self) == list(other)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(list(self))
+
+
 class Publisher:
+    __slots__ = ('__publisher_name', '__dict__', '__weakref__')
+
     def __init__(self, publisher_name: str):
         if publisher_name == "" or type(publisher_name) is not str:
             self.__publisher_name = None
@@ -37,6 +111,8 @@ class Publisher:
 
 
 class Genre:
+    __slots__ = ('__genre_name', '__dict__', '__weakref__')
+
     def __init__(self, genre_name: str):
         if genre_name == "" or type(genre_name) is not str:
             self.__genre_name = None
@@ -65,6 +141,15 @@ class Genre:
 
 
 class Game:
+    # Attributes live in slots rather than a per-instance dict. __dict__ is still allowed so SQLAlchemy's
+    # classical mapper can instrument the class in database mode, but it is only allocated once something is
+    # stored in it, which never happens in memory mode. The relationship lists are created on first use.
+    __slots__ = ('__game_id', '__game_title', '__price', '__release_date', '__description', '__image_url',
+                 '__website_url', '__recommendations', '__genres', '__reviews', '__publisher', '__favourite_users',
+                 '__review_count', '__rating_sum', '__rating_counts', '__dict__', '__weakref__')
+
+    NO_RATINGS = (0, 0, 0, 0, 0, 0)  # number of reviews giving each rating from 0 to 5
+
     def __init__(self, game_id: int, game_title: str):
         if type(game_id) is not int or game_id < 0:
             raise ValueError("Game ID should be a positive integer!")
@@ -80,11 +165,13 @@ class Game:
         self.__description = None
         self.__image_url = None
         self.__website_url = None
-        self.__genres: list = []
-        self.__reviews: list = []
+        self.__recommendations = 0
         self.__publisher = None
+        # Running totals over the reviews, so the ratings are summarised without visiting every review
+        self.__review_count = 0
+        self.__rating_sum = 0
+        self.__rating_counts = Game.NO_RATINGS
         # self.__languages: list = []
-        self.__favourite_users = []
 
     @property
     def publisher(self) -> Publisher:
@@ -172,13 +259,60 @@ class Game:
         else:
             self.__website_url = None
 
+    @property
+    def recommendations(self) -> int:
+        return self.__recommendations
+
+    @recommendations.setter
+    def recommendations(self, recommendations: int):
+        if type(recommendations) is int and recommendations >= 0:
+            self.__recommendations = recommendations
+        else:
+            raise ValueError("Recommendations must be a non-negative integer!")
+
+    @property
+    def review_count(self) -> int:
+        return self.__review_count
+
+    @property
+    def rating_sum(self) -> int:
+        return self.__rating_sum
+
+    @property
+    def rating_counts(self) -> tuple:
+        return self.__rating_counts
+
+    @property
+    def average_rating(self):
+        if self.__review_count == 0:
+            return None
+        return self.__rating_sum / self.__review_count
+
+    def tally_rating(self, rating: int, change: int = 1):
+        # Counts a review's rating in (or, with change=-1, out of) the totals. add_review and remove_review do
+        # this; the database repository updates the stored totals in SQL instead.
+        self.__review_count += change
+        self.__rating_sum += rating * change
+        counts = list(self.__rating_counts)
+        counts[rating] += change
+        self.__rating_counts = tuple(counts)
+
     @property
     def reviews(self) -> list:
-        return self.__reviews
+        try:
+            return self.__reviews
+        except AttributeError:
+            self.__reviews = []
+            return self.__reviews
 
     @property
     def genres(self) -> list:
-        return self.__genres
+        # A plain list: a game has only a handful of genres, too few for a keyed set to pay for its dict
+        try:
+            return self.__genres
+        except AttributeError:
+            self.__genres = []
+            return self.__genres
 
     """@property
     def languages(self):
@@ -189,34 +323,38 @@ class Game:
         self.__languages = languages"""
 
     @property
-    def favourite_users(self):
-        return self.__favourite_users
+    def favourite_users(self) -> OrderedSet:
+        try:
+            return self.__favourite_users
+        except AttributeError:
+            self.__favourite_users = OrderedSet(key=User.username.fget)
+            return self.__favourite_users
 
     def add_genre(self, genre: Genre):
-        if not isinstance(genre, Genre) or genre in self.__genres:
+        if not isinstance(genre, Genre) or genre in self.genres:
             return
-        self.__genres.append(genre)
+        self.genres.append(genre)
 
     def remove_genre(self, genre: Genre):
         if not isinstance(genre, Genre):
             return
         try:
-            self.__genres.remove(genre)
+            self.genres.remove(genre)
         except ValueError:
             print(f"Could not find {genre} in list of genres.")
             pass
 
     def add_review(self, review):
-        if not isinstance(review, Review) or review in self.__reviews:
+        if not isinstance(review, Review) or review in self.reviews:
             return
-        self.__reviews.append(review)
-        print("HI I ADDED A REVIEW")
-        print("These are the games reviews",self.__reviews)
+        self.reviews.append(review)
+        self.tally_rating(review.rating)
 
     def remove_review(self, review):
-        if not isinstance(review, Review) or review not in self.__reviews:
+        if not isinstance(review, Review) or review not in self.reviews:
             return
-        self.__reviews.remove(review)
+        self.reviews.remove(review)
+        self.tally_rating(review.rating, -1)
 
     def add_language(self, language):
         if language not in self.__languages:
@@ -241,6 +379,8 @@ class Game:
 
 
 class User:
+    __slots__ = ('__username', '__password', '__reviews', '__favourite_games', '__dict__', '__weakref__')
+
     def __init__(self, username: str, password: str):
         if not isinstance(username, str) or username.strip() == "":
             raise ValueError('Username cannot be empty or non-string!')
@@ -252,8 +392,6 @@ class User:
         else:
             raise ValueError('Password not valid!')
 
-        self.__reviews: list[Review] = []
-        self.__favourite_games: list[Game] = []
 
     @property
     def username(self):
@@ -265,7 +403,11 @@ class User:
 
     @property
     def reviews(self) -> list:
-        return self.__reviews
+        try:
+            return self.__reviews
+        except AttributeError:
+            self.__reviews = []
+            return self.__reviews
 
     @password.setter
     def password(self, new_password):
@@ -275,28 +417,35 @@ class User:
             raise ValueError("New password must be a string")
 
     def add_review(self, new_review):
-        if not isinstance(new_review, Review) or new_review in self.__reviews:
+        if not isinstance(new_review, Review) or new_review in self.reviews:
             return
-        self.__reviews.append(new_review)
+        self.reviews.append(new_review)
 
     def remove_review(self, review):
-        if not isinstance(review, Review) or review not in self.__reviews:
+        if not isinstance(review, Review) or review not in self.reviews:
             return
-        self.__reviews.remove(review)
+        self.reviews.remove(review)
 
     @property
-    def favourite_games(self) -> list:
-        return self.__favourite_games
+    def favourite_games(self) -> OrderedSet:
+        try:
+            return self.__favourite_games
+        except AttributeError:
+            self.__favourite_games = OrderedSet(key=Game.game_id.fget)
+            return self.__favourite_games
+
+    def has_favourite(self, game_id: int) -> bool:
+        return self.favourite_games.contains_key(game_id)
 
     def add_favourite_game(self, game):
-        if not isinstance(game, Game) or game in self.__favourite_games:
+        if not isinstance(game, Game) or game in self.favourite_games:
             return
-        self.__favourite_games.append(game)
+        self.favourite_games.append(game)
 
     def remove_favourite_game(self, game):
-        if not isinstance(game, Game) or game not in self.__favourite_games:
+        if not isinstance(game, Game) or game not in self.favourite_games:
             return
-        self.__favourite_games.remove(game)
+        self.favourite_games.remove(game)
 
     def __repr__(self):
         return f"<User {self.__username}>"
@@ -316,6 +465,8 @@ class User:
 
 
 class Review:
+    __slots__ = ('__user', '__game', '__rating', '__comment', '__dict__', '__weakref__')
+
     def __init__(self, user: User, game: Game, rating: int, comment: str):
 
         if not isinstance(user, User):
@@ -380,7 +531,7 @@ class Wishlist:
             raise ValueError("User must be an instance of User class")
         self.__user = user
 
-        self.__list_of_games = []
+        self.__list_of_games = OrderedSet(key=Game.game_id.fget)
 
     def list_of_games(self):
         return self.__list_of_games
@@ -411,12 +562,8 @@ class Wishlist:
             return None
 
     def __iter__(self):
-        self.__current = 0
+        self.__current = iter(self.__list_of_games)
         return self
 
     def __next__(self):
-        if self.__current >= len(self.__list_of_games):
-            raise StopIteration
-        else:
-            self.__current += 1
-            return self.__list_of_games[self.__current - 1]
+        return next(self.__current)
@@ -0,0 +1,34 @@
+from flask import Blueprint, render_template, request, jsonify
+from games.leaderboards import services
+import games.adapters.repository as repo
+from games.home.services import get_unique_genres
+
+leaderboards_blueprint = Blueprint('leaderboards_bp', __name__, url_prefix='/leaderboards')
+
+# Number of games on each leaderboard, and the most the JSON endpoints hand out at once
+LEADERBOARD_SIZE = 50
+MAX_LEADERBOARD_SIZE = 100
+
+
+def _limit():
+    return min(max(request.args.get('limit', LEADERBOARD_SIZE, type=int), 1), MAX_LEADERBOARD_SIZE)
+
+
+@leaderboards_blueprint.route('/', methods=['GET'])
+def leaderboards():
+    return render_template('leaderboards/leaderboards.html',
+                           top_rated_games=services.get_top_rated_games(repo.repo_instance, LEADERBOARD_SIZE),
+                           most_wishlisted_games=services.get_most_wishlisted_games(repo.repo_instance,
+                                                                                    LEADERBOARD_SIZE),
+                           unique_genres=get_unique_genres(repo.repo_instance))  # for sidebar
+
+
+@leaderboards_blueprint.route('/top-rated', methods=['GET'])
+def top_rated():
+    # JSON leaderboard, e.g. /leaderboards/top-rated?limit=10
+    return jsonify(services.get_top_rated_games(repo.repo_instance, _limit()))
+
+
+@leaderboards_blueprint.route('/most-wishlisted', methods=['GET'])
+def most_wishlisted():
+    return jsonify(services.get_most_wishlisted_games(repo.repo_instance, _limit()))
@@ -0,0 +1,12 @@
+from games.adapters.repository import AbstractRepository
+
+
+def get_top_rated_games(repo: AbstractRepository, limit: int):
+    return [{'game_id': game.game_id, 'title': game.title, 'game_img': game.image_url,
+             'average_rating': round(average_rating, 1)}
+            for game, average_rating in repo.get_top_rated_games(limit)]
+
+
+def get_most_wishlisted_games(repo: AbstractRepository, limit: int):
+    return [{'game_id': game.game_id, 'title': game.title, 'game_img': game.image_url, 'wishlist_count': count}
+            for game, count in repo.get_most_wishlisted_games(limit)]
@@ -33,13 +33,12 @@ def toggle_wishlist():
     username = session['username']
     user = services.get_user_for_wishlist(username, repo.repo_instance)
     game = repo.repo_instance.get_game_id(game_id)
-    fav = repo.repo_instance.get_wishlist(username)
     if user is not None and game is not None:
         if action == 'add':
-            if game not in fav:
+            if not user.has_favourite(game_id):
                 repo.repo_instance.add_game_to_wishlist(username, game_id)
         elif action == 'remove':
-            if game in fav:
+            if user.has_favourite(game_id):
                 repo.repo_instance.remove_game_from_wishlist(username, game_id)
     return redirect(url_for('description_bp.description', game_id=game_id, user=user))
 
@@ -1,6 +1,9 @@
 import pytest
 from flask import session
 
+from games.browse.services import encode_cursor
+from games.domainmodel.model import Game
+
 """
 This file is for end to end testing of the website we built
 Type 'python -m pytest' without quotation mark in terminal for testing
@@ -18,6 +21,17 @@ def test_adding_and_display_review(client, auth):
     response = client.get('/description/435790')
     assert b"great" in response.data
 
+def test_description_reviews_page(client, auth):
+    auth.login()
+    client.post('review/435790', data={'review': 'great', 'rating': 4, 'game_id': 435790})
+    page = client.get('/description/435790/reviews?order=highest').get_json()
+    assert page['reviews'] == [{'username': 'admin', 'comment': 'great', 'rating': 4}]
+    assert page['next'] is None
+    assert client.get('/description/435790/reviews?cursor=bogus').get_json()['reviews'] == page['reviews']
+    # An unknown order shows, and keeps asking for, the newest reviews
+    response = client.get('/description/435790?order=bogus')
+    assert b'order=bogus' not in response.data and b'order=newest' in response.data
+
 def test_invalid_review(client, auth):
     auth.login()
     response = client.get('review/435790')
@@ -86,6 +100,21 @@ def test_games_with_id(client):
     assert b'10 Second Ninja X' in response.data
 
 
+def test_games_with_cursor_and_page_size(client):
+    # Testing the page_size parameter and following the next page link
+    response = client.get("/games?page_size=6")
+    assert response.status_code == 200
+    assert b'270 | Two Seventy US Election' in response.data
+    assert b'page_size=6' in response.data
+
+    # Testing a cursor that starts the page on a given game
+    cursor = encode_cursor('at', Game(855010, "270 | Two Seventy US Election"))
+    response = client.get(f"/games?cursor={cursor}")
+    assert response.status_code == 200
+    assert b'270 | Two Seventy US Election' in response.data
+    assert b'10 Second Ninja X' not in response.data
+
+
 def test_games_with_genre(client):
     # Testing getting games by genre page
     response = client.get("/genre/Action")
@@ -108,6 +137,29 @@ def test_games_with_search(client):
     assert b'Angry King' in response.data
 
 
+def test_search_suggestions(client):
+    # Testing the JSON suggestions used by the search bar
+    response = client.get("/search/suggest?q=call&limit=3")
+    assert response.status_code == 200
+    suggestions = response.get_json()
+    assert 0 < len(suggestions) <= 3
+    assert all(suggestion['text'].lower().startswith("call") for suggestion in suggestions)
+    assert client.get("/search/suggest").get_json() == []
+
+
+def test_leaderboards(client, auth):
+    auth.login()
+    client.post('review/435790', data={'review': 'great', 'rating': 4, 'game_id': 435790})
+    client.post('/wishlist/toggle_wishlist', data={'game_id': 435790, 'action': 'add'})
+    top_rated = client.get('/leaderboards/top-rated?limit=5').get_json()
+    assert [(game['game_id'], game['average_rating']) for game in top_rated] == [(435790, 4.0)]
+    most_wishlisted = client.get('/leaderboards/most-wishlisted').get_json()
+    assert [(game['title'], game['wishlist_count']) for game in most_wishlisted] == [('10 Second Ninja X', 1)]
+    response = client.get('/leaderboards/')
+    assert response.status_code == 200
+    assert b'10 Second Ninja X' in response.data
+
+
 def test_description(client):
     # Testing if getting description page works
     response = client.get("/description/435790")
@@ -1,7 +1,11 @@
 import pytest
 import os
-from games.domainmodel.model import Publisher, Genre, Game, Review, User, Wishlist
+import shutil
+import types
+from games.domainmodel.model import Publisher, Genre, Game, Review, User, Wishlist, OrderedSet
 from games.adapters.datareader.csvdatareader import GameFileCSVReader
+from games.adapters.datareader.snapshot import GameSnapshotFile
+from games.adapters.datareader.parallelreader import ParallelGameFileCSVReader, record_boundaries
 
 """
 This file is for unit testing of domain model we built in assignment 1
@@ -194,6 +198,15 @@ def test_game_website_url_setter():
     assert game.website_url is None
 
 
+def test_game_recommendations_setter():
+    game = Game(1, "Deer Journey")
+    assert game.recommendations == 0
+    game.recommendations = 1200
+    assert game.recommendations == 1200
+    with pytest.raises(ValueError):
+        game.recommendations = -1
+
+
 def test_game_eq():
     game1 = Game(1, "Domino House")
     game2 = Game(1, "Super Soccer Blast")
@@ -266,6 +279,21 @@ def test_game_add_remove_review():
     assert review2 not in game2.reviews
 
 
+def test_game_rating_totals():
+    game = Game(1, "Domino House")
+    review1 = Review(User("user1", "PWasdf1234"), game, 5, "Great game!")
+    review2 = Review(User("user2", "PWasdf1234"), game, 2, "Not for me")
+    assert game.review_count == 0 and game.average_rating is None
+    game.add_review(review1)
+    game.add_review(review2)
+    game.add_review(review1)
+    assert (game.review_count, game.rating_sum, game.average_rating) == (2, 7, 3.5)
+    assert game.rating_counts == (0, 0, 1, 0, 0, 1)
+    game.remove_review(review1)
+    game.remove_review(review1)
+    assert (game.review_count, game.rating_sum, game.rating_counts) == (1, 2, (0, 0, 1, 0, 0, 0))
+
+
 def test_user_initialization():
     user1 = User("Shyamli", "pw12345")
     user2 = User("asma", "pw67890")
@@ -489,3 +517,141 @@ def test_genres_dataset():
 
 
 
+
+
+# Unit tests for the catalog snapshot
+def test_snapshot_loads_same_games_as_csv(tmp_path):
+    csv_file_name = tmp_path / "games.csv"
+    shutil.copyfile(os.path.join(os.getcwd(), "games/adapters/data/games.csv"), csv_file_name)
+    snapshot = GameSnapshotFile(str(csv_file_name))
+    assert snapshot.freshness() == GameSnapshotFile.STALE
+
+    csv_games = snapshot.load_games()  # No snapshot yet, so this parses the csv and writes one
+    assert snapshot.freshness() == GameSnapshotFile.FRESH
+    snapshot_games = snapshot.load_games()
+    assert [(game.game_id, game.title, game.price, game.release_date, game.description, game.image_url,
+             game.recommendations, game.publisher, game.genres) for game in snapshot_games] == \
+           [(game.game_id, game.title, game.price, game.release_date, game.description, game.image_url,
+             game.recommendations, game.publisher, game.genres) for game in csv_games]
+
+
+def test_snapshot_is_rebuilt_when_csv_changes(tmp_path):
+    csv_file_name = tmp_path / "games.csv"
+    with open(os.path.join(os.getcwd(), "games/adapters/data/games.csv"), encoding='utf-8-sig') as file:
+        lines = file.read().split("\n")
+    csv_file_name.write_text("\n".join(lines[:3]) + "\n", encoding='utf-8')
+    snapshot = GameSnapshotFile(str(csv_file_name))
+    assert len(snapshot.load_games()) == 2
+
+    # Same contents with a new mtime is still usable, and loading it rewrites the header with the new mtime
+    os.utime(csv_file_name, ns=(0, 0))
+    assert snapshot.freshness() == GameSnapshotFile.MOVED
+    assert len(snapshot.load_games()) == 2
+    assert snapshot.freshness() == GameSnapshotFile.FRESH
+
+    csv_file_name.write_text("\n".join(lines[:4]) + "\n", encoding='utf-8')
+    assert snapshot.freshness() == GameSnapshotFile.STALE
+    assert len(snapshot.load_games()) == 3
+
+
+def test_csv_reader_iter_games_streams_games():
+    reader = GameFileCSVReader(os.path.join(os.getcwd(), "games/adapters/data/games.csv"))
+    games = reader.iter_games()
+    assert next(games).game_id == 7940
+    assert reader.dataset_of_games == []  # Nothing is kept while streaming
+    assert len(list(games)) == 876
+    assert reader.get_unique_genres_count() == len(create_csv_reader().dataset_of_genres)
+
+
+def test_csv_reader_defaults_missing_recommendations_to_zero(tmp_path):
+    csv_file_name = tmp_path / "games.csv"
+    csv_file_name.write_text('AppID,Name,Release date,Price,About the game,Header image,Recommendations,'
+                             'Publishers,Genres\n'
+                             '1,Blank,"Oct 21, 2008",0.0,About,image.jpg,,Studio,Action\n'
+                             '2,Malformed,"Oct 21, 2008",0.0,About,image.jpg,n/a,Studio,Action\n'
+                             '3,Counted,"Oct 21, 2008",0.0,About,image.jpg,42,Studio,Action\n', encoding='utf-8')
+    games = list(GameFileCSVReader(str(csv_file_name)).iter_games())
+    assert [(game.game_id, game.recommendations) for game in games] == [(1, 0), (2, 0), (3, 42)]
+
+
+def test_snapshot_of_missing_csv_loads_no_games(tmp_path):
+    snapshot = GameSnapshotFile(str(tmp_path / "missing.csv"))
+    assert snapshot.load_games() == []
+    assert os.listdir(tmp_path) == []  # No temporary snapshot left behind
+
+
+def test_snapshot_stopped_early_keeps_old_snapshot(tmp_path):
+    csv_file_name = tmp_path / "games.csv"
+    shutil.copyfile(os.path.join(os.getcwd(), "games/adapters/data/games.csv"), csv_file_name)
+    snapshot = GameSnapshotFile(str(csv_file_name))
+    games = snapshot.iter_games()
+    next(games)
+    games.close()
+    assert snapshot.freshness() == GameSnapshotFile.STALE
+    assert os.listdir(tmp_path) == ["games.csv"]
+
+
+def game_fields(games):
+    return [(game.game_id, game.title, game.price, game.release_date, game.description, game.image_url,
+             game.website_url, game.recommendations, game.publisher, game.genres) for game in games]
+
+
+def test_parallel_csv_reader_reads_same_dataset():
+    games_file_name = os.path.join(os.getcwd(), "games/adapters/data/games.csv")
+    reader = create_csv_reader()
+    # Small chunks, so the file is split in many places, including inside multi-line descriptions
+    parallel_reader = ParallelGameFileCSVReader(games_file_name, processes=2, chunk_bytes=20000)
+    parallel_reader.read_csv_file()
+    assert game_fields(parallel_reader.dataset_of_games) == game_fields(reader.dataset_of_games)
+    assert parallel_reader.dataset_of_publishers == reader.dataset_of_publishers
+    assert parallel_reader.dataset_of_genres == reader.dataset_of_genres
+
+
+def test_record_boundaries_skip_newlines_in_quotes(tmp_path):
+    csv_file_name = tmp_path / "games.csv"
+    csv_file_name.write_bytes(b'AppID,Name\n1,"Two\nlines, ""quoted\n"""\n2,Plain\n3,"Three\n\nlines"\n')
+    assert record_boundaries(str(csv_file_name), 1) == [11, 38, 46, 63]
+
+
+def test_csv_reader_shares_publishers_and_genres():
+    reader = create_csv_reader()
+    games = reader.dataset_of_games
+    genres = {id(genre) for game in games for genre in game.genres}
+    publishers = {id(game.publisher) for game in games}
+    assert len(genres) == reader.get_unique_genres_count()
+    assert len(publishers) == reader.get_unique_publishers_count()
+
+
+def test_domain_objects_use_slots():
+    game = Game(1, "Slotted")
+    assert isinstance(vars(Game)["_Game__price"], types.MemberDescriptorType)
+    assert isinstance(vars(Review)["_Review__rating"], types.MemberDescriptorType)
+    # Relationship lists are only created when first used
+    assert game.genres == [] and game.reviews == [] and game.favourite_users == []
+    game.add_genre(Genre("Action"))
+    assert type(game.genres) is list and game.genres == [Genre("Action")]
+    user = User("slotted", "Password1")
+    assert user.favourite_games == [] and user.reviews == []
+
+
+def test_ordered_set_keeps_insertion_order():
+    genres = OrderedSet([Genre("Action"), Genre("Puzzle")])
+    genres.append(Genre("Action"))
+    genres.append(Genre("Adventure"))
+    assert genres == [Genre("Action"), Genre("Puzzle"), Genre("Adventure")]
+    assert Genre("Puzzle") in genres and "Puzzle" not in genres
+    genres.remove(Genre("Puzzle"))
+    assert genres == [Genre("Action"), Genre("Adventure")] and genres[-1] == Genre("Adventure")
+    with pytest.raises(ValueError):
+        genres.remove(Genre("Puzzle"))
+
+
+def test_user_has_favourite():
+    user = User("collector", "Password1")
+    game = Game(7, "Favourite")
+    assert not user.has_favourite(7)
+    user.add_favourite_game(game)
+    user.add_favourite_game(Game(7, "Same id"))
+    assert user.has_favourite(7) and user.favourite_games == [game]
+    user.remove_favourite_game(game)
+    assert not user.has_favourite(7)
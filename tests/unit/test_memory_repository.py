@@ -2,6 +2,9 @@ import pytest
 
 from games.domainmodel.model import Publisher, Genre, Game, Review, User, Wishlist
 from games.adapters.memory_repository import MemoryRepository
+from games.adapters.trigram_index import TrigramIndex
+from games.adapters.prefix_index import PrefixIndex
+from games.adapters.leaderboard import Leaderboard
 
 """
 This file is for unit testing of memory repository
@@ -92,6 +95,36 @@ def test_add_review_to_repo(in_memory_repo):
     assert review1 in user.reviews
     assert review1 in game.reviews
 
+def test_repo_has_review(in_memory_repo):
+    repo = MemoryRepository()
+    user = User("Shyamli", "pw12345")
+    game = Game(1, "Domino Game")
+    repo.add_user(user)
+    repo.add_review(Review(user, game, 3, "Great game!"))
+    assert repo.has_review(1, "Shyamli")
+    assert not repo.has_review(2, "shyamli")
+    repo.remove_user(user)
+    assert not repo.has_review(1, "shyamli")
+    assert game.review_count == 0
+
+def test_repo_pages_through_reviews_for_game(in_memory_repo):
+    repo = MemoryRepository()
+    game = Game(1, "Domino Game")
+    reviews = [Review(User(f"reviewer{number}", "pw12345"), game, rating, f"Review {number}")
+               for number, rating in enumerate([3, 5, 1, 5])]
+    for review in reviews:
+        repo.add_review(review)
+    page, cursor = repo.get_reviews_for_game(1, limit=3)
+    assert page == [reviews[3], reviews[2], reviews[1]]
+    assert repo.get_reviews_for_game(1, cursor, limit=3) == ([reviews[0]], None)
+    page, cursor = repo.get_reviews_for_game(1, limit=2, order='highest')
+    assert page == [reviews[3], reviews[1]]
+    assert repo.get_reviews_for_game(1, cursor, limit=2, order='highest') == ([reviews[0], reviews[2]], None)
+    repo.add_user(reviews[3].user)
+    repo.remove_user(reviews[3].user)
+    assert repo.get_reviews_for_game(1, limit=1, order='highest')[0] == [reviews[1]]
+    assert repo.get_reviews_for_game(2) == ([], None)
+
 def test_get_review_from_repo(in_memory_repo):
     repo = MemoryRepository()
     user = User("Shyamli", "pw12345")
@@ -131,3 +164,220 @@ def remove_user(in_memory_repo):
     repo.remove_user(user)
     assert repo.get_user(username) == None
     assert repo.get_reviews()[0] == review2
+
+
+def test_repo_get_game_id_uses_index(in_memory_repo):
+    repo = MemoryRepository()
+    game1 = create_game1()
+    repo.add_game(game1)
+    assert repo.get_game_id(1) is game1
+    assert repo.get_game_id(3) is None  # Unknown ids return None rather than raising
+    assert in_memory_repo.get_game_id(435790).title == "10 Second Ninja X"
+
+
+def test_repo_can_get_users(in_memory_repo):
+    repo = MemoryRepository()
+    user1 = User("Shyamli", "pw12345")
+    user2 = User("test", "54321wp")
+    repo.add_user(user1)
+    repo.add_user(user2)
+    assert repo.get_user("  SHYAMLI ") is user1  # Lookups are case-folded like the stored usernames
+    assert repo.get_users(["test", "nobody", "Shyamli"]) == [user2, user1]
+    repo.remove_user(user1)
+    assert repo.get_user("Shyamli") is None
+
+
+def test_repo_keeps_title_sorted_view(in_memory_repo):
+    repo = MemoryRepository()
+    game1 = create_game1()
+    game2 = create_game2()
+    game3 = Game(3, "Aardvark")
+    repo.add_game(game2)
+    repo.add_game(game1)
+    repo.add_game(game3)
+    assert repo.get_games_sorted_by_title() == [game3, game1, game2]
+    assert repo.get_games_sorted_by_title(1, 1) == [game1]
+    assert repo.get_title_rank(2) == 2
+    assert repo.get_title_rank(4) is None
+    titles = [game.title for game in in_memory_repo.get_games_sorted_by_title()]
+    assert titles == sorted(titles)
+
+
+def test_repo_indexes_games_by_genre(in_memory_repo):
+    repo = MemoryRepository()
+    game1 = create_game1()
+    game1.add_genre(Genre("Action"))
+    game2 = create_game2()
+    game2.add_genre(Genre("Action"))
+    game2.add_genre(Genre("Sandbox"))
+    repo.add_game(game2)
+    repo.add_game(game1)
+    assert repo.count_games_by_genre("Action") == 2
+    assert repo.count_games_by_genre("Puzzle") == 0
+    assert repo.get_games_by_genre("Action") == [game1, game2]
+    assert repo.get_games_by_genre("Action", (game1.title, game1.game_id)) == [game2]
+    assert repo.get_games_by_genre_before("Action", limit=1) == [game2]
+    assert repo.get_games_by_genre("Sandbox") == [game2]
+    assert in_memory_repo.get_games_by_genre("Adventure", limit=1)[0].title == "1000 Amps"
+
+
+def test_repo_caches_unique_genres(in_memory_repo):
+    repo = MemoryRepository()
+    game1 = create_game1()
+    game1.add_genre(Genre("Shooter"))
+    repo.add_game(game1)
+    assert repo.get_unique_genres() == [Genre("Shooter")]
+    assert repo.get_unique_genres() is repo.get_unique_genres()  # Served from the cache until a genre is added
+    game2 = create_game2()
+    game2.add_genre(Genre("Sandbox"))
+    repo.add_game(game2)
+    assert repo.get_unique_genres() == [Genre("Sandbox"), Genre("Shooter")]
+
+
+def test_repo_can_get_games_in_price_range(in_memory_repo):
+    repo = MemoryRepository()
+    game1 = create_game1()
+    game2 = create_game2()
+    game3 = Game(3, "Free Game")
+    game3.price = 0
+    repo.add_game(game1)
+    repo.add_game(game2)
+    repo.add_game(game3)
+    repo.add_game(Game(4, "Unpriced Game"))  # Games without a price are left off the shelves
+    assert repo.get_games_in_price_range(-1, 0) == [game3]
+    assert repo.get_games_in_price_range(0, 11.99) == [game1, game2]
+    assert repo.get_games_in_price_range(9.99) == [game2]
+    assert repo.get_games_in_price_range(-1, limit=2) == [game3, game1]
+
+
+def test_trigram_index_finds_substrings():
+    index = TrigramIndex()
+    index.add(1, "Adventure Apes")
+    index.add(2, "Grape Escape")
+    index.add(3, "Pea Soup")
+    assert index.search("APE") == {1, 2}
+    assert index.search("apes") == {1}
+    assert index.search("pe") == {1, 2, 3}  # Shorter than a trigram
+    assert index.search("ape soup") == set()  # Every trigram matches a document but not as one substring
+    assert index.search("xyz") == set()
+
+
+def test_repo_search_matches_substring_scan(in_memory_repo):
+    # The index has to give exactly the games a plain substring scan would
+    games = in_memory_repo.get_games_sorted_by_title()
+    for query in ["ape", "100", "an", "Game", "studio", "zzzz"]:
+        lowered = query.lower()
+        by_title = [game for game in games if lowered in game.title.lower()]
+        by_publisher = [game for game in games if lowered in game.publisher.publisher_name.lower()]
+        by_either = [game for game in games if game in by_title or game in by_publisher]
+        assert in_memory_repo.search_games(query, "title") == by_title
+        assert in_memory_repo.search_games(query, "publisher") == by_publisher
+        assert in_memory_repo.search_games(query, "all") == by_either
+    assert [game.title for game in in_memory_repo.search_games("angry", "title", "Action")] == ["Angry King"]
+    assert in_memory_repo.search_games("angry", "title", "Sports") == []
+
+
+def test_prefix_index_ranks_by_weight():
+    index = PrefixIndex()
+    index.add("Call of Duty", "title", 1, 500)
+    index.add("Call to Arms", "title", 2, 900)
+    index.add("Calamity", "title", 3, 0)
+    index.add("Calm Studio", "publisher", "Calm Studio", 100)
+    index.add("Calm Studio", "publisher", "Calm Studio", 800)  # Another game by the same publisher
+    assert index.suggest("CALL") == [("Call to Arms", "title", 2), ("Call of Duty", "title", 1)]
+    assert index.suggest("cal", 2) == [("Call to Arms", "title", 2), ("Calm Studio", "publisher", "Calm Studio")]
+    assert index.suggest("") == []
+    assert index.suggest("xyz") == []
+
+
+
+def test_prefix_index_keeps_the_best_entries_for_short_prefixes():
+    index = PrefixIndex()
+    index.add_all((f"Title {number}", "title", number, number % 7) for number in range(50))
+    index.add("Title Studio", "publisher", "Title Studio", 5)
+    index.add("Title Studio", "publisher", "Title Studio", 5)  # Climbs past the titles weighing 6
+    for prefix in ("t", "Ti", "tit"):
+        # A limit above SHORT_PREFIX_LIMIT scans the entries instead
+        assert index.suggest(prefix, 10) == index.suggest(prefix, 11)[:10]
+    assert index.suggest("t", 1) == [("Title Studio", "publisher", "Title Studio")]
+    assert index.suggest("x") == []
+
+
+def test_repo_can_get_search_suggestions(in_memory_repo):
+    suggestions = in_memory_repo.get_search_suggestions("call of", 3)
+    assert suggestions[0] == ("Call of Duty® 4: Modern Warfare®", "title", 7940)
+    assert all(text.lower().startswith("call of") for text, _, _ in suggestions)
+
+
+def test_repo_can_add_games_in_bulk():
+    repo = MemoryRepository()
+    games = [Game(game_id, f"Game {game_id}") for game_id in range(5, 0, -1)]
+    progress = []
+    repo.add_games(games, progress.append, batch_size=2)
+    assert progress == [2, 4, 5]
+    progress = []
+    MemoryRepository().add_games(games[:4], progress.append, batch_size=2)
+    assert progress == [2, 4]
+    assert [game.game_id for game in repo.get_games()] == [1, 2, 3, 4, 5]
+    assert repo.get_game_id(3).title == "Game 3"
+
+
+def test_repo_bulk_load_matches_adding_games_one_at_a_time(in_memory_repo):
+    games = list(reversed(in_memory_repo.get_games()))
+    one_at_a_time = MemoryRepository()
+    for game in games:
+        one_at_a_time.add_game(game)
+    bulk = MemoryRepository()
+    bulk.add_games(games)
+    for repo in (one_at_a_time, bulk):
+        assert repo.get_games() == in_memory_repo.get_games()
+        assert repo.get_games_sorted_by_title() == in_memory_repo.get_games_sorted_by_title()
+        assert repo.get_games_in_price_range(-1) == in_memory_repo.get_games_in_price_range(-1)
+        assert repo.get_games_by_genre("Action", limit=None) == \
+            in_memory_repo.get_games_by_genre("Action", limit=None)
+        assert repo.get_search_suggestions("the") == in_memory_repo.get_search_suggestions("the")
+        assert repo.get_unique_genres() == in_memory_repo.get_unique_genres()
+
+
+def test_repo_can_get_first_and_last_game_by_title(in_memory_repo):
+    games = in_memory_repo.get_games_sorted_by_title()
+    assert in_memory_repo.get_first_game_by_title() == games[0]
+    assert in_memory_repo.get_last_game_by_title() == games[-1]
+    action_games = in_memory_repo.get_games_by_genre("Action", limit=in_memory_repo.count_games_by_genre("Action"))
+    assert in_memory_repo.get_first_game_by_title("Action") == action_games[0]
+    assert in_memory_repo.get_last_game_by_title("Action") == action_games[-1]
+    assert in_memory_repo.get_first_game_by_title("No such genre") is None
+    assert MemoryRepository().get_last_game_by_title() is None
+
+
+def test_leaderboard_keeps_items_in_score_order():
+    board = Leaderboard()
+    board.update("a", (3.0, 1))
+    board.update("b", (4.5, 2))
+    board.update("c", (3.0, 4))
+    assert board.top(2) == [("b", (4.5, 2)), ("c", (3.0, 4))]
+    board.update("b", (1.0, 3))
+    board.update("c")
+    assert board.top(5) == [("a", (3.0, 1)), ("b", (1.0, 3))]
+    assert len(board) == 2 and board.score("c") is None
+
+
+def test_repo_keeps_leaderboards(in_memory_repo):
+    game1, game2, game3 = in_memory_repo.get_games()[:3]
+    users = [User(f"ranker{number}", "pw12345") for number in range(3)]
+    for user in users:
+        in_memory_repo.add_user(user)
+    in_memory_repo.add_review(Review(users[0], game1, 3, "Fine"))
+    in_memory_repo.add_review(Review(users[0], game2, 5, "Great"))
+    in_memory_repo.add_review(Review(users[1], game1, 5, "Great"))
+    assert in_memory_repo.get_top_rated_games(2) == [(game2, 5.0), (game1, 4.0)]
+    for user in users:
+        in_memory_repo.add_game_to_wishlist(user.username, game3.game_id)
+    in_memory_repo.add_game_to_wishlist("ranker0", game1.game_id)
+    in_memory_repo.add_game_to_wishlist("ranker0", game1.game_id)
+    in_memory_repo.remove_game_from_wishlist("ranker1", game3.game_id)
+    assert in_memory_repo.get_most_wishlisted_games(5) == [(game3, 2), (game1, 1)]
+
+    in_memory_repo.remove_user(users[0])
+    assert in_memory_repo.get_top_rated_games(5) == [(game1, 5.0)]
+    assert in_memory_repo.get_most_wishlisted_games(5) == [(game3, 1)]
@@ -193,6 +193,27 @@ def test_can_get_game_alphabetically(in_memory_repo):
         "title"]  # Check alphabetical order
 
 
+def test_can_page_games_with_cursor(in_memory_repo):
+    # Test the first page, following the next cursor and coming back with the previous cursor
+    first_page, previous_cursor, next_cursor = browse_services.get_games_page(None, 5, in_memory_repo)
+    assert [game['game_id'] for game in first_page][0] == 435790
+    assert previous_cursor is None and next_cursor is not None
+
+    second_page, previous_cursor, next_cursor = browse_services.get_games_page(next_cursor, 5, in_memory_repo)
+    assert second_page[0]['game_id'] == 855010
+    assert browse_services.get_games_page(previous_cursor, 5, in_memory_repo)[0] == first_page
+
+    # Test the last page, and that an old game id and a malformed cursor still give a page
+    last_page, previous_cursor, next_cursor = browse_services.get_games_page(
+        browse_services.encode_cursor('prev'), 5, in_memory_repo)
+    assert last_page[-1]['title'] == "银魂：Silver Soul" and next_cursor is None
+    cursor = browse_services.cursor_for_game_id(855010, in_memory_repo)
+    assert browse_services.get_games_page(cursor, 5, in_memory_repo)[0] == second_page
+    assert browse_services.get_games_page("not a cursor", 5, in_memory_repo)[0] == first_page
+    assert browse_services.decode_cursor(browse_services.encode_cursor('next', Game(1, "Domino Game"))) == \
+           ('next', ("Domino Game", 1))
+
+
 def test_get_games_using_search(in_memory_repo):
     # Test getting games for a search key 'title' AND 'publisher'
     # Test getting games for a search key ‘title’
@@ -320,6 +341,32 @@ def test_validity_of_review(in_memory_repo):
     review = Review(user, repo.get_game_id(1), 1, "great")
     repo.add_review(review)
     assert description_services.validity_of_review(1, "shyamli", repo) == False
+    assert description_services.validity_of_review(1, "someone", repo) == True
+
+
+def test_get_reviews_page(in_memory_repo):
+    repo = MemoryRepository()
+    game = Game(1, "Domino Game")
+    for number in range(3):
+        repo.add_review(Review(User(f"reviewer{number}", "pw12345"), game, number, f"Review {number}"))
+    page, cursor = description_services.get_reviews_page(1, repo, order='highest', page_size=2)
+    assert [review['comment'] for review in page] == ["Review 2", "Review 1"]
+    page, cursor = description_services.get_reviews_page(1, repo, cursor, 'highest', page_size=2)
+    assert page == [{'username': 'reviewer0', 'comment': 'Review 0', 'rating': 0}] and cursor is None
+    # A cursor from the other order starts again from the first page
+    _, cursor = description_services.get_reviews_page(1, repo, order='newest', page_size=2)
+    page, _ = description_services.get_reviews_page(1, repo, cursor, 'highest', page_size=2)
+    assert page[0]['comment'] == "Review 2"
+
+
+def test_average_rating(in_memory_repo):
+    repo = MemoryRepository()
+    game = Game(1, "Domino Game")
+    repo.add_game(game)
+    assert description_services.average_rating(1, repo) == "No reviews"
+    repo.add_review(Review(User("first", "pw12345"), game, 4, "good"))
+    repo.add_review(Review(User("second", "pw12345"), game, 1, "bad"))
+    assert description_services.average_rating(1, repo) == 2.5
 
 
 """
@@ -4,7 +4,7 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, clear_mappers
 
 from games.adapters import database_repository, repository_populate
-from games.adapters.orm import metadata, map_model_to_tables
+from games.adapters.orm import metadata, map_model_to_tables, create_search_index
 import games.adapters.repository as repo
 
 
@@ -35,6 +35,7 @@ def session_factory():
     metadata.create_all(engine)
     for table in reversed(metadata.sorted_tables):
         engine.execute(table.delete())
+    create_search_index(engine)
     map_model_to_tables()
     session_factory = sessionmaker(autocommit=False, autoflush=True, bind=engine)
     repo.repo_instance = database_repository.SqlAlchemyRepository(session_factory)
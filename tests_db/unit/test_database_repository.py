@@ -1,8 +1,10 @@
 import pytest
+from sqlalchemy import select
 
 import games.adapters.repository as repo
 from games.adapters.database_repository import SqlAlchemyRepository
-from games.domainmodel.model import User, Game, Review, Genre, Publisher
+from games.adapters.orm import rankings_table
+from games.domainmodel.model import User, Game, Review, Genre, Publisher, OrderedSet
 from games.adapters.repository import RepositoryException
 
 
@@ -74,6 +76,59 @@ def test_repository_can_add_review(session_factory):
     assert retrieved_review == [review]
 
 
+def test_repository_stores_each_publisher_once(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+    user = User('Shyamli', 'pw12345')
+    game = create_game1()  # Published by Activision, which is already stored
+    Review(user, game, 5, "This is a great game!")
+    repo.add_user(user)  # Brings the game in through the user's review
+    repo.add_game(game)
+    first, second = create_game2(), create_game2()
+    second._Game__game_id = 3
+    second.publisher = Publisher("Re-Logic")  # A second copy of a publisher that is not stored yet
+    repo.add_game(first)
+    repo.add_game(second)
+    session = session_factory()
+    for name in ("Activision", "Re-Logic"):
+        assert session.query(Publisher).filter(Publisher._Publisher__publisher_name == name).count() == 1
+    assert repo.get_game_id(1).publisher == Publisher("Activision")
+    assert repo.get_game_id(3).publisher is repo.get_game_id(2).publisher
+
+
+def test_repository_keeps_rating_totals(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+    user = User('Shyamli', 'pw12345')
+    game = create_game1()
+    repo.add_user(user)
+    repo.add_game(game)
+    repo.add_review(Review(user, game, 4, "This is a great game!"))
+    assert repo.has_review(game.game_id, 'shyamli')
+    assert not repo.has_review(game.game_id, 'someone')
+    session = session_factory()
+    stored = session.query(Game).get(game.game_id)
+    assert (stored.review_count, stored.rating_sum, stored.rating_counts) == (1, 4, (0, 0, 0, 0, 1, 0))
+    repo.remove_user(repo.get_user('shyamli'))
+    assert not repo.has_review(game.game_id, 'shyamli')
+    assert repo.get_game_id(game.game_id).review_count == 0
+
+
+def test_repository_rating_totals_add_up_across_sessions(session_factory):
+    first_repo = SqlAlchemyRepository(session_factory)
+    second_repo = SqlAlchemyRepository(session_factory)
+    game_id = first_repo.get_games_after(None, 1)[0].game_id
+    for number, repo in enumerate([first_repo, second_repo]):
+        repo.add_user(User(f'reviewer{number}', 'ABCdef1234'))
+    # Both sessions hold the game before either review is written
+    first_game = first_repo.get_game_id(game_id)
+    second_game = second_repo.get_game_id(game_id)
+    first_repo.add_review(Review(first_repo.get_user('reviewer0'), first_game, 1, "Dull"))
+    second_repo.add_review(Review(second_repo.get_user('reviewer1'), second_game, 4, "Fun"))
+    stored = session_factory().query(Game).get(game_id)
+    assert (stored.review_count, stored.rating_sum, stored.rating_counts) == (2, 5, (0, 1, 0, 0, 1, 0))
+    assert second_repo.get_top_rated_games(1) == [(stored, 2.5)]
+    assert session_factory().execute(select(rankings_table.c.review_count)).scalar() == 2
+
+
 def test_repository_can_get_reviews(session_factory):
     repo = SqlAlchemyRepository(session_factory)
     user = User('Shyamli', 'pw12345')
@@ -106,6 +161,18 @@ def test_repo_can_add_game_to_wishlist(session_factory):
     assert user_wishlist == [game1, game2]
 
 
+def test_repo_wishlist_has_favourite(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+    repo.add_user(User('Shyamli', 'pw12345'))
+    game1 = create_game1()
+    repo.add_game(game1)
+    repo.add_game_to_wishlist('Shyamli', game1.game_id)
+    user = repo.get_user('Shyamli')
+    assert isinstance(user.favourite_games, OrderedSet)
+    assert user.has_favourite(game1.game_id)
+    assert not user.has_favourite(create_game2().game_id)
+
+
 def test_repo_can_remove_game_from_wishlist(session_factory):
     repo = SqlAlchemyRepository(session_factory)
     user = User('Shyamli', 'pw12345')
@@ -215,3 +282,281 @@ def test_repo_can_remove_user(session_factory):
     repo.remove_user(user)
     assert repo.get_user(username) == None
     assert repo.get_reviews(1)[0] == review2
+
+
+def test_repo_can_get_users(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+    user = User('Shyamli', 'pw12345')
+    repo.add_user(user)
+    assert repo.get_users(['Shyamli', 'nobody', 'admin']) == [user, User('admin', 'ABCdef1234')]
+    assert repo.get_users([]) == []
+
+
+def test_repo_can_get_games_sorted_by_title(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+    first_games = repo.get_games_sorted_by_title(0, 2)
+    assert first_games[0] == Game(435790, "10 Second Ninja X")
+    assert repo.get_title_rank(435790) == 0
+    assert repo.get_title_rank(first_games[1].game_id) == 1
+    assert repo.get_games_sorted_by_title(876, 5) == [Game(1580640, "银魂：Silver Soul")]
+    assert repo.get_title_rank(1) is None
+
+
+def test_repo_can_seek_games_by_title(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+    first_page = repo.get_games_after(None, 5)
+    assert first_page == repo.get_games_sorted_by_title(0, 5)
+    key = (first_page[-1].title, first_page[-1].game_id)
+    assert repo.get_games_after(key, 5) == repo.get_games_sorted_by_title(5, 5)
+    assert repo.get_games_after(key, 1, inclusive=True) == [first_page[-1]]
+    assert repo.get_games_before(key, 5) == first_page[:4]
+    assert repo.get_games_before(None, 1) == [Game(1580640, "银魂：Silver Soul")]
+
+
+def test_repo_can_get_games_by_genre(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+    first_games = repo.get_games_by_genre("Adventure", limit=2)
+    assert first_games[0].title == "1000 Amps"
+    assert first_games[1].title == "A Blind Legend"
+    key = (first_games[0].title, first_games[0].game_id)
+    assert repo.get_games_by_genre("Adventure", key, 1) == [first_games[1]]
+    assert repo.get_games_by_genre_before("Adventure", (first_games[1].title, first_games[1].game_id), 5) == \
+           [first_games[0]]
+    assert repo.count_games_by_genre("Adventure") == len(repo.get_games_by_genre("Adventure", limit=1000))
+    assert repo.count_games_by_genre("Not a genre") == 0
+
+
+def test_repo_can_get_unique_genres(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+    genres = repo.get_unique_genres()
+    assert len(genres) == 24
+    assert genres[0] == Genre("Action")
+    assert genres[-1] == Genre("Web Publishing")
+
+
+def test_repo_can_get_games_in_price_range(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+    free_games = repo.get_games_in_price_range(-1, 0, 1000)
+    assert len(free_games) == 125
+    assert free_games[0].title == "270 | Two Seventy US Election"
+    under_5_games = repo.get_games_in_price_range(0, 5, 3)
+    assert len(under_5_games) == 3
+    assert under_5_games[0].title == "ARENA 8"
+
+
+def test_repo_can_search_games(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+    all_searched_games = repo.search_games("ape", "all")
+    assert all_searched_games[0].title == "100 Doors: Escape from Work"
+    assert all_searched_games[1].title == "Adventure Apes and the Mayan Mystery"
+    assert len(all_searched_games) == 17 and repo.count_search_games("ape", "all") == 17
+    assert repo.count_search_games("APE", "title") == 15
+    assert [game.title for game in repo.search_games("ape", "publisher")] == \
+           ["Intergalactic Bubbles", "Yousei Daisensou ~ Touhou Sangetsusei"]
+    assert [game.title for game in repo.search_games("angry", "title", "Action")] == ["Angry King"]
+    assert repo.search_games("abcd", "all") == []
+
+    # Paging through the results
+    first_game = all_searched_games[0]
+    assert repo.search_games("ape", "all", None, (first_game.title, first_game.game_id), 1) == [all_searched_games[1]]
+    assert repo.search_games_before("ape", "all", None, None, 1) == [all_searched_games[-1]]
+
+    # Queries shorter than a trigram and newly added games are found as well
+    assert repo.count_search_games("10", "title") == len([game for game in repo.get_games() if "10" in game.title])
+    game = create_game2()
+    repo.add_game(game)
+    assert game in repo.search_games("terraria", "title")
+
+
+def test_repo_can_get_search_suggestions(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+    assert repo.get_search_suggestions("call of", 1) == [("Call of Duty® 4: Modern Warfare®", "title", 7940)]
+    game = create_game2()
+    repo.add_game(game)
+    assert ("Terraria", "title", 2) in repo.get_search_suggestions("terr")
+
+
+def test_repo_close_session_starts_a_new_session(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+    assert repo.get_user('admin') is not None
+    first_session = repo._session_cm.session()
+    repo.close_session()
+    assert repo._session_cm.session() is not first_session
+    assert repo.get_user('admin') == User('admin', 'ABCdef1234')
+
+
+def test_create_database_engine_uses_configured_pool():
+    from sqlalchemy.pool import QueuePool, SingletonThreadPool, NullPool
+    from games import create_database_engine
+    config = {'SQLALCHEMY_DATABASE_URI': 'sqlite:///games-test.db', 'SQLALCHEMY_POOL': 'queue',
+              'SQLALCHEMY_POOL_SIZE': 3}
+    engine = create_database_engine(config)
+    assert isinstance(engine.pool, QueuePool) and engine.pool.size() == 3
+    config['SQLALCHEMY_POOL'] = 'null'
+    assert isinstance(create_database_engine(config).pool, NullPool)
+    config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    assert isinstance(create_database_engine(config).pool, SingletonThreadPool)
+
+
+def test_repo_can_add_games_in_bulk(session_factory):
+    from games.adapters.orm import publishers_table, genres_table
+    repo = SqlAlchemyRepository(session_factory)
+    game1 = create_game1()
+    game1.add_genre(Genre("Action"))
+    game1.add_genre(Genre("Shooter"))
+    game2 = create_game2()
+    game2.add_genre(Genre("Shooter"))
+    progress = []
+    number_of_games = repo.get_number_of_games()
+    repo.add_games([game1, game2], progress.append, batch_size=1)
+    assert progress == [1, 2]
+    assert repo.get_number_of_games() == number_of_games + 2
+    game = repo.get_game_id(1)
+    assert game.title == "Call of Duty® 4: Modern Warfare®"
+    assert game.publisher == Publisher("Activision")
+    assert sorted(genre.genre_name for genre in game.genres) == ["Action", "Shooter"]
+    assert [genre.genre_name for genre in repo.get_game_id(2).genres] == ["Shooter"]
+    assert Genre("Shooter") in repo.get_unique_genres()
+    with repo._session_cm as scm:
+        connection = scm.session.connection()
+        # Existing names are reused, new ones are inserted once
+        assert len(connection.execute(
+            genres_table.select().where(genres_table.c.genre_name == "Shooter")).all()) == 1
+        assert len(connection.execute(
+            publishers_table.select().where(publishers_table.c.name == "Re-Logic")).all()) == 1
+    assert [g.game_id for g in repo.search_games("terraria", "title")] == [2]
+
+
+def test_create_database_engine_applies_sqlite_profile(tmp_path):
+    from games import create_database_engine
+    config = {'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "profile.db"}', 'SQLITE_PROFILE': 'tuned',
+              'SQLITE_BUSY_TIMEOUT': 1234}
+    with create_database_engine(config).connect() as connection:
+        assert connection.exec_driver_sql('PRAGMA journal_mode').scalar() == 'wal'
+        assert connection.exec_driver_sql('PRAGMA synchronous').scalar() == 1  # NORMAL
+        assert connection.exec_driver_sql('PRAGMA busy_timeout').scalar() == 1234
+    config['SQLITE_PROFILE'] = 'default'
+    config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{tmp_path / "default.db"}'
+    with create_database_engine(config).connect() as connection:
+        assert connection.exec_driver_sql('PRAGMA journal_mode').scalar() == 'delete'
+
+
+def test_repo_add_game_reuses_stored_genres(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+    game = create_game1()
+    game.add_genre(Genre("Action"))
+    repo.add_game(game)
+    assert repo.get_game_id(1).genres == [Genre("Action")]
+    assert len(repo.get_unique_genres()) == 24
+    assert repo.count_games_by_genre("Action") > 1
+
+
+def count_statements(session_factory, work):
+    from sqlalchemy import event
+    engine = session_factory.kw['bind']
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        work()
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    return len(statements)
+
+
+def test_repo_loads_pages_in_a_constant_number_of_statements(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+
+    def show_page(genre_name=None):
+        games = repo.get_games_by_genre(genre_name, limit=20) if genre_name else repo.get_games_after(None, 20)
+        return [(game.game_id, game.title, game.release_date, game.image_url) for game in games]
+
+    assert count_statements(session_factory, show_page) == 1
+    assert count_statements(session_factory, lambda: show_page("Action")) == 1
+    repo.close_session()
+
+    user = User('reviewer', 'ABCdef1234')
+    repo.add_user(user)
+    for game in repo.get_games_after(None, 2):
+        repo.add_review(Review(user, game, 4, "Good"))
+    repo.close_session()
+
+    def show_description():
+        game = repo.get_game_details(repo.get_games_after(None, 1)[0].game_id)
+        reviews, _ = repo.get_reviews_for_game(game.game_id)
+        return (game.description, game.publisher.publisher_name, [genre.genre_name for genre in game.genres],
+                [review.user.username for review in reviews])
+
+    # The page query, two for the details and one for the first page of reviews
+    assert count_statements(session_factory, show_description) == 4
+    assert repo.get_game_details(-1) is None
+
+
+def test_repo_pages_through_reviews_for_game(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+    game = create_game1()
+    repo.add_game(game)
+    for number, rating in enumerate([3, 5, 1, 5]):
+        user = User(f'reviewer{number}', 'ABCdef1234')
+        repo.add_user(user)
+        repo.add_review(Review(user, game, rating, f"Review {number}"))
+
+    reviews, cursor = repo.get_reviews_for_game(game.game_id, limit=3)
+    assert [review.comment for review in reviews] == ["Review 3", "Review 2", "Review 1"]
+    reviews, cursor = repo.get_reviews_for_game(game.game_id, cursor, limit=3)
+    assert [review.comment for review in reviews] == ["Review 0"] and cursor is None
+
+    reviews, cursor = repo.get_reviews_for_game(game.game_id, limit=2, order='highest')
+    assert [review.comment for review in reviews] == ["Review 3", "Review 1"]
+    reviews, cursor = repo.get_reviews_for_game(game.game_id, cursor, limit=2, order='highest')
+    assert [review.comment for review in reviews] == ["Review 0", "Review 2"] and cursor is None
+    assert repo.get_reviews_for_game(2) == ([], None)
+
+
+def test_repo_keeps_leaderboards(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+    game1, game2, game3 = repo.get_games_after(None, 3)
+    users = [User(f"ranker{number}", 'ABCdef1234') for number in range(3)]
+    for user in users:
+        repo.add_user(user)
+    repo.add_review(Review(users[0], game1, 3, "Fine"))
+    repo.add_review(Review(users[0], game2, 5, "Great"))
+    repo.add_review(Review(users[1], game1, 5, "Great"))
+    assert repo.get_top_rated_games(2) == [(game2, 5.0), (game1, 4.0)]
+    for user in users:
+        repo.add_game_to_wishlist(user.username, game3.game_id)
+    repo.add_game_to_wishlist("ranker0", game1.game_id)
+    repo.add_game_to_wishlist("ranker0", game1.game_id)
+    repo.remove_game_from_wishlist("ranker1", game3.game_id)
+    assert repo.get_most_wishlisted_games(5) == [(game3, 2), (game1, 1)]
+
+    repo.remove_user(repo.get_user("ranker0"))
+    assert repo.get_top_rated_games(5) == [(game1, 5.0)]
+    assert repo.get_most_wishlisted_games(5) == [(game3, 1)]
+    assert count_statements(session_factory, lambda: repo.get_top_rated_games(50)) == 1
+
+
+def test_repo_can_get_first_and_last_game_by_title(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+    assert repo.get_first_game_by_title() == Game(435790, "10 Second Ninja X")
+    assert repo.get_last_game_by_title() == Game(1580640, "银魂：Silver Soul")
+    action_games = repo.get_games_by_genre("Action", limit=repo.count_games_by_genre("Action"))
+    assert repo.get_first_game_by_title("Action") == action_games[0]
+    assert repo.get_last_game_by_title("Action") == action_games[-1]
+    assert repo.get_first_game_by_title("No such genre") is None
+    assert count_statements(session_factory, repo.get_last_game_by_title) == 1
+    assert count_statements(session_factory, repo.get_number_of_games) == 1
+
+
+def test_repo_add_game_reuses_stored_publisher(session_factory):
+    from games.adapters.orm import publishers_table
+    repo = SqlAlchemyRepository(session_factory)
+    repo.add_game(create_game1())  # Published by Activision, which is already stored
+    with repo._session_cm as scm:
+        rows = scm.session.connection().execute(
+            publishers_table.select().where(publishers_table.c.name == "Activision")).all()
+    assert len(rows) == 1
+    assert repo.get_game_id(1).publisher == Publisher("Activision")
@@ -40,7 +40,7 @@ def insert_publisher(empty_session):
     return row[0]
 
 def insert_genre(empty_session):
-    empty_session.execute('INSERT INTO genres (genre_name) VALUES ("testgenre")')
+    empty_session.execute('INSERT OR IGNORE INTO genres (genre_name) VALUES ("testgenre")')
     row = empty_session.execute('SELECT genre_id from genres').fetchone()
     return row[0]
 
@@ -150,4 +150,64 @@ def test_loading_and_saving_publishers(empty_session):
     # publisher id is 2 because it autoincrement
     fetched_publisher2 = empty_session.query(Publisher).get(2)
     assert fetched_publisher2.publisher_name == "anothercompany"
-    assert fetched_publisher2 == new_publisher
\ No newline at end of file
+    assert fetched_publisher2 == new_publisher
+
+def test_upgrade_schema_migrates_older_databases():
+    from sqlalchemy import create_engine, inspect
+    from games.adapters.orm import upgrade_schema
+    engine = create_engine('sqlite://')
+    # Tables as created by older versions: no indexes, a genre and publisher row per game and no keys on the
+    # association tables
+    for statement in [
+        'CREATE TABLE games (game_id INTEGER PRIMARY KEY, title VARCHAR(255), price FLOAT, genres INTEGER)',
+        'CREATE TABLE genres (genre_id INTEGER PRIMARY KEY, genre_name VARCHAR(64))',
+        'CREATE TABLE publishers (name VARCHAR(255), publisher_id INTEGER PRIMARY KEY)',
+        'CREATE TABLE game_genres (id INTEGER PRIMARY KEY, game_id INTEGER, genre_id INTEGER)',
+        'CREATE TABLE reviews (review_id INTEGER PRIMARY KEY, game_id INTEGER, comment VARCHAR(255), '
+        'rating INTEGER, user_id INTEGER)',
+        'CREATE TABLE user_favourite_games (user_id INTEGER, game_id INTEGER)',
+        'INSERT INTO games VALUES (1, "A", 1.0, 1), (2, "B", 2.0, 3)',
+        'INSERT INTO genres VALUES (1, "Action"), (2, "Indie"), (3, "Action")',
+        'INSERT INTO publishers VALUES ("Valve", 1), ("Indie Co", 2), ("Valve", 3)',
+        'INSERT INTO game_genres (game_id, genre_id) VALUES (1, 1), (1, 2), (2, 3)',
+        'INSERT INTO user_favourite_games VALUES (1, 1), (1, 1), (1, 2)',
+        'INSERT INTO reviews (game_id, comment, rating, user_id) VALUES (1, "Good", 4, 1), (1, "Fine", 3, 2)',
+    ]:
+        engine.execute(statement)
+
+    catalog = [Game(1, "A"), Game(2, "B"), Game(3, "Not stored")]
+    catalog[0].recommendations = 120
+    upgrade_schema(engine, catalog)
+    upgrade_schema(engine)  # Running it again on an upgraded database changes nothing
+
+    assert engine.execute('SELECT * FROM genres ORDER BY genre_id').fetchall() == [(1, 'Action'), (2, 'Indie')]
+    assert engine.execute('SELECT * FROM game_genres ORDER BY game_id, genre_id').fetchall() == \
+           [(1, 1), (1, 2), (2, 1)]
+    assert engine.execute('SELECT genres FROM games ORDER BY game_id').fetchall() == [(1,), (1,)]
+    assert engine.execute('SELECT recommendations FROM games ORDER BY game_id').fetchall() == [(120,), (0,)]
+    assert engine.execute('SELECT * FROM publishers ORDER BY publisher_id').fetchall() == \
+           [('Valve', 1), ('Indie Co', 2)]
+    assert engine.execute('SELECT * FROM user_favourite_games').fetchall() == [(1, 1), (1, 2)]
+    assert engine.execute('SELECT review_count, rating_sum, rating_counts FROM games ORDER BY game_id').fetchall() == \
+           [(2, 7, '0,0,0,1,1,0'), (0, 0, '0,0,0,0,0,0')]
+    assert engine.execute('SELECT * FROM rankings ORDER BY game_id').fetchall() == [(1, 3.5, 2, 1), (2, 0, 0, 1)]
+    inspector = inspect(engine)
+    assert inspector.get_pk_constraint('user_favourite_games')['constrained_columns'] == ['user_id', 'game_id']
+    assert {index['name'] for index in inspector.get_indexes('reviews')} == \
+           {'ix_reviews_game_id_user_id', 'ix_reviews_game_id_review_id', 'ix_reviews_game_id_rating',
+            'ix_reviews_user_id'}
+    assert {index['name'] for index in inspector.get_indexes('games')} == {'ix_games_title', 'ix_games_price'}
+    with pytest.raises(IntegrityError):
+        engine.execute('INSERT INTO genres (genre_name) VALUES ("Indie")')
+    with pytest.raises(IntegrityError):
+        engine.execute('INSERT INTO publishers (name) VALUES ("Valve")')
+
+
+def test_clearing_mappers_restores_slots(empty_session):
+    import types
+    from sqlalchemy.orm import clear_mappers
+    from games.adapters.orm import map_model_to_tables
+    clear_mappers()
+    assert isinstance(vars(Game)['_Game__price'], types.MemberDescriptorType)
+    assert isinstance(vars(User)['_User__favourite_games'], types.MemberDescriptorType)
+    map_model_to_tables()
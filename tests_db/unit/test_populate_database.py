@@ -13,7 +13,7 @@ Type 'python -m pytest tests_db' without quotation mark in terminal to test func
 def test_database_populate_inspect_table_names(database_engine):
     inspector = inspect(database_engine)
     # Look at here or DB browser if you want to know what table is in which index
-    assert inspector.get_table_names() == ['game_genres', 'games', 'genres', 'publishers', 'reviews', 'user_favourite_games', 'users']
+    assert inspector.get_table_names() == ['game_genres', 'games', 'genres', 'publishers', 'rankings', 'reviews', 'user_favourite_games', 'users']
 
 def test_database_populate_select_all_users(database_engine):
     inspector = inspect(database_engine)